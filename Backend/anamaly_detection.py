@@ -1,51 +1,86 @@
 # app/models.py
 import numpy as np
 import pandas as pd
-from sklearn.cluster import KMeans
-from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
 
 class EnergyAnalyzer:
     def __init__(self, n_clusters=3, contamination=0.05):
+        # sklearn is imported on first construction rather than with the module
+        from sklearn.cluster import KMeans
+        from sklearn.preprocessing import StandardScaler
+
         self.n_clusters = n_clusters
         self.contamination = contamination
         self.scaler = StandardScaler()
         self.kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-        self.iso_forest = IsolationForest(contamination=contamination, random_state=42)
+        self.distance_threshold = None
+
+    @property
+    def is_fitted(self):
+        return self.distance_threshold is not None
+
+    def fit(self, df: pd.DataFrame):
+        """
+        Fit the scaler and cluster model once on historical data
+
+        Args:
+            df: DataFrame with columns ['hour_of_day', 'energy_usage']
+
+        Returns:
+            self, so the analyzer can be built and fitted in one expression
+        """
+        scaled_data = self.scaler.fit_transform(df[["hour_of_day", "energy_usage"]])
+        self.kmeans.fit(scaled_data)
+
+        # Points further from their cluster centre than all but `contamination` of the history are anomalies
+        min_distances = self.kmeans.transform(scaled_data).min(axis=1)
+        self.distance_threshold = np.percentile(min_distances, 100 * (1 - self.contamination))
+        return self
+
+    def score(self, df: pd.DataFrame):
+        """
+        Score new points against the fitted model without refitting
+
+        Args:
+            df: DataFrame with columns ['hour_of_day', 'energy_usage']
+
+        Returns:
+            dict with analysis results including clusters and anomalies
+        """
+        if not self.is_fitted:
+            raise RuntimeError("EnergyAnalyzer.fit() must be called before score()")
+
+        scaled_data = self.scaler.transform(df[["hour_of_day", "energy_usage"]])
+        distances = self.kmeans.transform(scaled_data)
+        clusters = distances.argmin(axis=1)
+        anomalies = np.where(distances.min(axis=1) > self.distance_threshold, -1, 1)
+
+        return {
+            'clusters': clusters,
+            'anomalies': anomalies,
+            'data': df.assign(cluster=clusters, anomaly_score=anomalies).to_dict(orient="records")
+        }
 
     def detect_patterns(self, df: pd.DataFrame):
-        features = df[["hour_of_day", "energy_usage"]]
-        df["cluster"] = self.kmeans.fit_predict(features)
+        # Scored against the warm model, so this never refits (and replaces) it
+        df["cluster"] = self.analyze(df)['clusters']
         return df, df["cluster"].tolist()
 
     def detect_anomalies(self, df: pd.DataFrame):
-        features = df[["hour_of_day", "energy_usage"]]
-        df["anomaly_score"] = self.iso_forest.fit_predict(features)
+        df["anomaly_score"] = self.analyze(df)['anomalies']
         return df, df["anomaly_score"].tolist()
 
     def analyze(self, df: pd.DataFrame):
         """
         Analyze energy usage patterns and detect anomalies
-        
+
+        Uses the warm model from fit() when available, otherwise fits on df first.
+
         Args:
             df: DataFrame with columns ['hour_of_day', 'energy_usage']
         
         Returns:
             dict with analysis results including clusters and anomalies
         """
-        # Scale the features
-        scaled_data = self.scaler.fit_transform(df[["hour_of_day", "energy_usage"]])
-        
-        # Cluster the data points
-        clusters = self.kmeans.fit_predict(scaled_data)
-        
-        # Simple anomaly detection (consider points far from cluster centers as anomalies)
-        distances = self.kmeans.transform(scaled_data)
-        min_distances = distances.min(axis=1)
-        anomalies = np.where(min_distances > np.percentile(min_distances, 95), -1, 1)
-        
-        return {
-            'clusters': clusters,
-            'anomalies': anomalies,
-            'data': df.assign(cluster=clusters, anomaly_score=anomalies).to_dict(orient="records")  # send full annotated data
-        }
+        if not self.is_fitted:
+            self.fit(df)
+        return self.score(df)
@@ -0,0 +1,86 @@
+import threading
+from collections import deque
+
+
+class ApplianceRegistry:
+    """Appliances indexed by id, with running aggregates over the active ones
+
+    Iterating yields the appliance dicts in insertion order, so code that
+    walks the list keeps working. Status changes must go through
+    set_status(), which keeps total/per-type active load and counts current
+    in O(1) and records the change for stream subscribers.
+    """
+
+    def __init__(self, appliances=()):
+        self._by_id = {}
+        self._active_by_type = {}
+        self._load_by_type = {}
+        self.active_load = 0
+        self.active_count = 0
+        self._changes = deque(maxlen=10000)
+        self._lock = threading.Lock()
+        for appliance in appliances:
+            self.add(appliance)
+
+    def __iter__(self):
+        return iter(list(self._by_id.values()))
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def get(self, appliance_id):
+        return self._by_id.get(appliance_id)
+
+    def add(self, appliance):
+        with self._lock:
+            if appliance['id'] in self._by_id:
+                raise ValueError(f"Duplicate appliance id {appliance['id']}")
+            self._by_id[appliance['id']] = appliance
+            self._load_by_type.setdefault(appliance['type'], 0)
+            self._active_by_type.setdefault(appliance['type'], {})
+            if appliance['status'] == 'on':
+                self._activate(appliance)
+
+    def set_status(self, appliance_id, status):
+        """Change an appliance's status; returns (appliance, previous_status) or (None, None)"""
+        with self._lock:
+            appliance = self._by_id.get(appliance_id)
+            if appliance is None:
+                return None, None
+            previous = appliance['status']
+            if previous == status:
+                return appliance, previous
+            if previous == 'on':
+                self._deactivate(appliance)
+            appliance['status'] = status
+            if status == 'on':
+                self._activate(appliance)
+            self._changes.append((appliance_id, status, previous))
+            return appliance, previous
+
+    def _activate(self, appliance):
+        self.active_load += appliance['power_rating']
+        self.active_count += 1
+        self._load_by_type[appliance['type']] += appliance['power_rating']
+        self._active_by_type[appliance['type']][appliance['id']] = appliance
+
+    def _deactivate(self, appliance):
+        self.active_load -= appliance['power_rating']
+        self.active_count -= 1
+        self._load_by_type[appliance['type']] -= appliance['power_rating']
+        del self._active_by_type[appliance['type']][appliance['id']]
+
+    def active_of_type(self, appliance_type):
+        """Active appliances of one type"""
+        return list(self._active_by_type.get(appliance_type, {}).values())
+
+    def load_by_type(self):
+        """Active power rating (W) per type, including types with nothing on"""
+        return dict(self._load_by_type)
+
+    def drain_changes(self):
+        """Status changes since the last call, oldest first, as (id, status, previous_status)"""
+        with self._lock:
+            changes = list(self._changes)
+            self._changes.clear()
+        return changes
@@ -0,0 +1,56 @@
+import numpy as np
+
+
+class BaselineIndex:
+    """Running per-hour and per-(hour, day-of-week) consumption averages
+
+    Sums and counts are kept in fixed-size arrays, so lookups and updates
+    cost the same no matter how much history has been added.
+    """
+
+    def __init__(self):
+        self.hour_sum = np.zeros(24)
+        self.hour_count = np.zeros(24, dtype=np.int64)
+        self.hour_dow_sum = np.zeros((24, 7))
+        self.hour_dow_count = np.zeros((24, 7), dtype=np.int64)
+
+    @classmethod
+    def from_frame(cls, df, hour_col='Hour', dow_col='DayOfWeek', value_col='Total_Energy_kWh'):
+        index = cls()
+        index.add_many(df[hour_col].values, df[dow_col].values, df[value_col].values)
+        return index
+
+    def add(self, hour, dayofweek, value):
+        """Fold one new reading into the baselines"""
+        self.hour_sum[hour] += value
+        self.hour_count[hour] += 1
+        self.hour_dow_sum[hour, dayofweek] += value
+        self.hour_dow_count[hour, dayofweek] += 1
+
+    def add_many(self, hours, dayofweeks, values):
+        """Fold a batch of readings into the baselines"""
+        hours = np.asarray(hours, dtype=np.int64)
+        dayofweeks = np.asarray(dayofweeks, dtype=np.int64)
+        values = np.asarray(values, dtype=float)
+        np.add.at(self.hour_sum, hours, values)
+        np.add.at(self.hour_count, hours, 1)
+        np.add.at(self.hour_dow_sum, (hours, dayofweeks), values)
+        np.add.at(self.hour_dow_count, (hours, dayofweeks), 1)
+
+    def hourly_average(self, hour):
+        """Average for the hour(s); NaN where no history exists"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.hour_sum[hour] / self.hour_count[hour]
+
+    def hourly_dow_average(self, hour, dayofweek, fallback=True):
+        """Average for the (hour, day-of-week) slot(s)
+
+        With fallback, slots without history use the plain hourly average.
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            avg = self.hour_dow_sum[hour, dayofweek] / self.hour_dow_count[hour, dayofweek]
+        if fallback:
+            avg = np.where(np.isnan(avg), self.hourly_average(hour), avg)
+            if np.ndim(avg) == 0:
+                avg = avg.item()
+        return avg
@@ -0,0 +1,330 @@
+"""Benchmark suite with a JSON baseline and regression gates
+
+Covers the analyzer, the EMS model methods, chart rendering and every
+Flask route (through the test client) at several data scales. Synthetic
+sites for each scale are generated into a scratch directory.
+
+    python benchmarks.py --scales small,medium                # compare with the baseline
+    python benchmarks.py --scales all --update-baseline       # record a new baseline
+
+Exits with status 1 when any benchmark's p50 latency or throughput is worse
+than the baseline by more than --threshold (ignoring differences below
+--noise-floor-ms), or when importing a service and creating its app in a
+fresh interpreter takes longer than its IMPORT_BUDGET_MS.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+SCALES = {
+    'small': {"days": 30, "appliances": 10},
+    'medium': {"days": 365, "appliances": 100},
+    'large': {"days": 3 * 365, "appliances": 1000},
+    'xlarge': {"days": 5 * 365, "appliances": 10000},
+}
+
+# Startup budget (p50 ms) for `import <module>; <module>.create_app()` in a fresh interpreter
+IMPORT_BUDGET_MS = {
+    'future_predictions': 500,
+    'energy_analysis': 800,
+}
+STARTUP_SCRIPT = ("import time; started = time.perf_counter(); import {module}; {module}.create_app(); "
+                  "print((time.perf_counter() - started) * 1000)")
+
+
+def measure(fn, setup=None, min_time=0.5, min_runs=5, max_runs=1000):
+    """Time fn() after one warmup call; setup() runs before each call, outside the timing"""
+    if setup:
+        setup()
+    fn()
+    times = []
+    deadline = time.perf_counter() + min_time
+    while len(times) < min_runs or (time.perf_counter() < deadline and len(times) < max_runs):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return summarize(np.array(times) * 1000)
+
+
+def summarize(ms):
+    return {
+        "runs": len(ms),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "ops_per_sec": round(float(1000 / ms.mean()), 2)
+    }
+
+
+def startup_times(module, here, runs=5):
+    """Milliseconds to import `module` and create its app, each run in a fresh interpreter"""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(p for p in (here, env.get('PYTHONPATH')) if p)
+    times = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-W', 'ignore', '-c', STARTUP_SCRIPT.format(module=module)],
+                             capture_output=True, text=True, env=env, check=True)
+        times.append(float(out.stdout.strip().splitlines()[-1]))
+    return np.array(times)
+
+
+def client_call(client, method, path, kwargs):
+    """One test-client request that fails the benchmark on an error status"""
+    def call():
+        response = client.open(path, method=method, **kwargs)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {path} returned {response.status_code}")
+    return call
+
+
+class BenchmarkRun:
+    def __init__(self, min_time=0.5):
+        self.min_time = min_time
+        self.results = {}
+        self.skipped = {}
+        self.over_budget = []
+
+    def bench(self, name, fn, setup=None, min_runs=5):
+        print(f"  {name} ...", end='', flush=True)
+        try:
+            result = measure(fn, setup, min_time=self.min_time, min_runs=min_runs)
+        except Exception as e:
+            self.skipped[name] = f"failed: {e}"
+            print(f" failed ({e})")
+            return
+        self.results[name] = result
+        print(f" p50 {result['p50_ms']} ms, {result['ops_per_sec']} ops/s")
+
+    def startup(self, module, here, runs=5):
+        name = f"startup/import {module}"
+        print(f"  {name} ...", end='', flush=True)
+        try:
+            result = summarize(startup_times(module, here, runs))
+        except subprocess.CalledProcessError as e:
+            reason = (e.stderr.strip().splitlines() or [f"exited with status {e.returncode}"])[-1]
+            self.skipped[name] = f"failed: {reason}"
+            print(f" failed ({reason})")
+            return
+        result['budget_ms'] = IMPORT_BUDGET_MS[module]
+        self.results[name] = result
+        if result['p50_ms'] > result['budget_ms']:
+            self.over_budget.append(name)
+        print(f" p50 {result['p50_ms']} ms (budget {result['budget_ms']} ms)")
+
+
+def bench_analyzer(run, scale, history):
+    from anamaly_detection import EnergyAnalyzer
+
+    hourly = pd.DataFrame({
+        'hour_of_day': np.tile(np.arange(24), len(history)),
+        'energy_usage': np.repeat(history.column('consumption') / 24, 24)
+    })
+    warm = EnergyAnalyzer().fit(hourly)
+    run.bench(f"{scale}/EnergyAnalyzer.analyze (cold)", lambda: EnergyAnalyzer().analyze(hourly), min_runs=3)
+    run.bench(f"{scale}/EnergyAnalyzer.analyze (warm)", lambda: warm.analyze(hourly))
+
+
+def bench_ems(run, scale, fp, workdir):
+    from loadtest import EMS_ROUTES, LoadState
+    from model_registry import ModelRegistry
+
+    ems = fp.sites.get(scale)
+    ems.retrainer.wait()
+    client = fp.create_app().test_client()
+
+    def cold_registry():
+        ems.model_registry = ModelRegistry(tempfile.mkdtemp(dir=workdir))
+
+    run.bench(f"{scale}/ems.train_models (cold)", ems.train_models, setup=cold_registry, min_runs=3)
+    run.bench(f"{scale}/ems.train_models (warm)", ems.train_models)
+
+    def clear_forecast():
+        ems._forecast_cache = None
+
+    run.bench(f"{scale}/ems.predict_consumption", lambda: ems.predict_consumption(1), setup=clear_forecast)
+    run.bench(f"{scale}/ems.predict_consumption (cached)", lambda: ems.predict_consumption(1))
+    run.bench(f"{scale}/ems.detect_anomalies", lambda: ems.detect_anomalies(55.0))
+
+    # Every route that finishes on its own, /api ones scoped to this scale's site; cached GETs are measured on a cache miss
+    state = LoadState(sites=[scale], appliance_ids=[a['id'] for a in ems.appliances])
+    for route in EMS_ROUTES:
+        if not route.bench:
+            continue
+        method, path, kwargs = route.build(state)
+        run.bench(f"{scale}/{route.name}", client_call(client, method, path, kwargs), setup=fp.response_cache.clear)
+
+
+def bench_analysis(run, scale, ea, site_dir):
+    from loadtest import ANALYSIS_ROUTES, LoadState
+
+    # Grow the analysis history to this scale's hourly readings before timing
+    with open(os.path.join(site_dir, 'hourly.ndjson')) as f:
+        points = [json.loads(line) for line in f]
+    analysis = ea.get_analysis()
+    analysis.add_readings(pd.DataFrame({
+        'Timestamp': pd.to_datetime([p['timestamp'] for p in points]),
+        'Total_Energy_kWh': [p['energy_kwh'] for p in points],
+        'Temperature_C': [p['temperature_c'] for p in points]
+    }))
+
+    last_24h = analysis.data.tail(24)
+    predicted = analysis.model.predict(last_24h[ea.features])
+    run.bench(f"{scale}/generate_consumption_chart",
+              lambda: ea.generate_consumption_chart(last_24h['Timestamp'], last_24h['Total_Energy_kWh'], predicted),
+              min_runs=3)
+
+    client = ea.create_app().test_client()
+    chart_url = client.post('/energy_analysis', json={"timestamp": "2025-09-27T19:00:00", "temperature_c": 23.5}).get_json()['consumption_chart_url']
+    state = LoadState(chart_path=chart_url)
+    for route in ANALYSIS_ROUTES:
+        if not route.bench:
+            continue
+        method, path, kwargs = route.build(state)
+        run.bench(f"{scale}/{route.name}", client_call(client, method, path, kwargs))
+
+
+def run_suite(scales, workdir, here, min_time=0.5, startup_runs=5):
+    import synthetic_data
+    from history_store import load_json
+
+    os.chdir(workdir)
+    import future_predictions as fp
+    fp.SITES_ROOT = os.path.join(workdir, 'sites')
+    try:
+        import energy_analysis as ea
+    except ImportError as e:
+        ea = None
+        analysis_skip = f"failed: energy_analysis not importable: {e}"
+
+    run = BenchmarkRun(min_time)
+    if startup_runs:
+        print("[startup]")
+        run.startup('future_predictions', here, startup_runs)
+        if ea is not None:
+            run.startup('energy_analysis', here, startup_runs)
+        else:
+            run.skipped["startup/import energy_analysis"] = analysis_skip
+    for scale in scales:
+        spec = SCALES[scale]
+        site_dir = os.path.join(fp.SITES_ROOT, scale)
+        print(f"[{scale}] {spec['days']} days, {spec['appliances']} appliances")
+        synthetic_data.generate_site(site_dir, spec['appliances'], spec['days'], readings=False)
+        _, history = load_json(os.path.join(site_dir, 'energy_data.json'))
+
+        bench_analyzer(run, scale, history)
+        bench_ems(run, scale, fp, workdir)
+        if ea is not None:
+            bench_analysis(run, scale, ea, site_dir)
+        else:
+            run.skipped[f"{scale}/energy_analysis"] = analysis_skip
+    fp.sites.close_all()
+    return run
+
+
+def compare(results, baseline, threshold, noise_floor_ms):
+    """Benchmarks that got slower or lost throughput beyond the threshold"""
+    regressions = []
+    for name, result in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None:
+            continue
+        slower = result['p50_ms'] > base['p50_ms'] * (1 + threshold) \
+            and result['p50_ms'] - base['p50_ms'] > noise_floor_ms
+        lost_throughput = result['ops_per_sec'] < base['ops_per_sec'] * (1 - threshold) \
+            and result['mean_ms'] - base['mean_ms'] > noise_floor_ms
+        if slower or lost_throughput:
+            regressions.append((name, base, result))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run benchmarks and gate on regressions against a baseline")
+    parser.add_argument('--scales', default='small,medium', help=f"comma-separated from {', '.join(SCALES)}, or 'all'")
+    parser.add_argument('--baseline', default='benchmark_baseline.json')
+    parser.add_argument('--update-baseline', action='store_true', help="write these results as the new baseline")
+    parser.add_argument('--threshold', type=float, default=0.25, help="allowed fractional regression")
+    parser.add_argument('--noise-floor-ms', type=float, default=1.0, help="ignore regressions smaller than this")
+    parser.add_argument('--min-time', type=float, default=0.5, help="seconds to spend per benchmark")
+    parser.add_argument('--startup-runs', type=int, default=5, help="fresh interpreters per import-time check (0 to skip)")
+    parser.add_argument('--output', default=None, help="also write this run's results here")
+    parser.add_argument('--keep-workdir', action='store_true')
+    args = parser.parse_args()
+
+    scales = list(SCALES) if args.scales == 'all' else [s for s in args.scales.split(',') if s]
+    unknown = [s for s in scales if s not in SCALES]
+    if unknown:
+        parser.error(f"unknown scale(s): {', '.join(unknown)}")
+
+    # Benchmarks run in a scratch directory so models, databases and sites don't touch the checkout
+    here = os.path.dirname(os.path.abspath(__file__))
+    baseline_path = os.path.abspath(args.baseline)
+    output_path = os.path.abspath(args.output) if args.output else None
+    sys.path.insert(0, here)
+    workdir = tempfile.mkdtemp(prefix='ems-bench-')
+    try:
+        run = run_suite(scales, workdir, here, args.min_time, args.startup_runs)
+    finally:
+        os.chdir(here)
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "recorded_at": datetime.datetime.now().isoformat(timespec='seconds'),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "scales": scales
+        },
+        "results": run.results,
+        "skipped": run.skipped
+    }
+    if output_path:
+        with open(output_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    for name, reason in run.skipped.items():
+        print(f"SKIPPED {name}: {reason}")
+    for name in run.over_budget:
+        result = run.results[name]
+        print(f"OVER BUDGET {name}: p50 {result['p50_ms']} ms > {result['budget_ms']} ms")
+
+    if args.update_baseline or not os.path.exists(baseline_path):
+        if os.path.exists(baseline_path):
+            with open(baseline_path) as f:
+                previous = json.load(f)
+            # Keep results for scales that weren't part of this run
+            previous['results'].update(run.results)
+            report['results'] = previous['results']
+        with open(baseline_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {baseline_path}")
+        if run.over_budget:
+            sys.exit(1)
+        return
+
+    with open(baseline_path) as f:
+        baseline = json.load(f)['results']
+    regressions = compare(run.results, baseline, args.threshold, args.noise_floor_ms)
+    for name, base, result in regressions:
+        print(f"REGRESSION {name}: p50 {base['p50_ms']} -> {result['p50_ms']} ms, "
+              f"{base['ops_per_sec']} -> {result['ops_per_sec']} ops/s")
+    if regressions or run.over_budget or any(reason.startswith('failed') for reason in run.skipped.values()):
+        sys.exit(1)
+    print(f"No regressions beyond {args.threshold:.0%} across {len(run.results)} benchmarks")
+
+
+if __name__ == '__main__':
+    main()
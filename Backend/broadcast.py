@@ -0,0 +1,119 @@
+import json
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """One subscriber's bounded outbox of pre-encoded SSE messages"""
+
+    def __init__(self, hub, max_pending):
+        self.hub = hub
+        self._queue = queue.Queue(maxsize=max_pending)
+
+    def push(self, message):
+        # A slow client loses its oldest messages rather than holding up the publisher
+        while True:
+            try:
+                self._queue.put_nowait(message)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def stream(self, heartbeat=15):
+        """Yield SSE messages, with a comment line as heartbeat when idle"""
+        try:
+            yield b": connected\n\n"
+            while True:
+                try:
+                    yield self._queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield b": heartbeat\n\n"
+        finally:
+            self.hub.unsubscribe(self)
+
+
+class BroadcastHub:
+    """Fan-out of server-sent events to many subscribers
+
+    Each event is serialized once and the same bytes are pushed to every
+    subscriber's queue, so publishing costs one encode plus one enqueue per
+    client.
+    """
+
+    def __init__(self, max_pending=100):
+        self.max_pending = max_pending
+        self.published = 0
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def subscribe(self):
+        subscription = Subscription(self, self.max_pending)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @staticmethod
+    def encode(event, data):
+        return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n".encode()
+
+    def publish(self, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        if not subscribers:
+            return
+        message = self.encode(event, data)
+        for subscription in subscribers:
+            subscription.push(message)
+        self.published += 1
+
+
+class Publisher:
+    """Runs a publish callback on its own thread whenever one is requested
+
+    request() only sets a flag, so request handlers and the ingest worker
+    never pay for building, encoding and fanning out events. Requests that
+    arrive while a publish is running are folded into a single further run.
+    """
+
+    def __init__(self, publish_fn, name='sse-publisher'):
+        self.publish_fn = publish_fn
+        self.runs = 0
+        self.last_error = None
+        self._wanted = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def request(self):
+        self._wanted.set()
+
+    def _run(self):
+        while True:
+            self._wanted.wait()
+            if self._closed:
+                return
+            self._wanted.clear()
+            try:
+                self.publish_fn()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.exception("Publishing stream updates failed")
+            self.runs += 1
+
+    def close(self):
+        self._closed = True
+        self._wanted.set()
+        self._thread.join(timeout=5)
@@ -0,0 +1,121 @@
+import datetime
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+from metrics import timed
+
+
+def render_consumption_chart(timestamps, actual, predicted, pool=None):
+    """Render the actual vs predicted chart to PNG bytes.
+
+    Uses a standalone Figure instead of pyplot so no global matplotlib state
+    is shared between threads. With a serving.WorkPool the render runs on
+    that pool (the timing then includes any wait for a free worker).
+    """
+    with timed('chart_render'):
+        if pool is None:
+            return _render_consumption_chart(timestamps, actual, predicted)
+        return pool.run(_render_consumption_chart, timestamps, actual, predicted)
+
+
+def _render_consumption_chart(timestamps, actual, predicted):
+    # matplotlib takes a noticeable share of startup, so it loads with the first chart
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(10, 5))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.plot(timestamps, actual, label='Actual')
+    ax.plot(timestamps, predicted, label='Predicted', linestyle='dashed')
+    ax.set_xlabel('Timestamp')
+    ax.set_ylabel('Energy Consumption (kWh)')
+    ax.set_title('Actual vs Predicted Energy Consumption')
+    ax.legend()
+    fig.tight_layout()
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png')
+    return buf.getvalue()
+
+
+class ChartEntry:
+    def __init__(self, png):
+        self.png = png
+        self.etag = hashlib.sha1(png).hexdigest()
+        self.last_modified = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+
+
+class ChartCache:
+    """LRU cache of rendered charts keyed by (data_version, model_version)"""
+
+    def __init__(self, max_entries=16):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._rendering = {}
+        self._lock = threading.Lock()
+
+    def get(self, data_version, model_version):
+        key = (data_version, model_version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def get_or_render(self, data_version, model_version, render):
+        """Return the cached entry, calling render() to build the PNG on a miss"""
+        entry = self.get(data_version, model_version)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        self.misses += 1
+
+        # Render under a per-key lock so concurrent misses for the same key only render once,
+        # while lookups of other charts carry on
+        key = (data_version, model_version)
+        with self._lock:
+            render_lock = self._rendering.setdefault(key, threading.Lock())
+        with render_lock:
+            # Another thread may have rendered it while we waited; a raw lookup, not another hit or miss
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is not None:
+                return entry
+            try:
+                entry = ChartEntry(render())
+            except BaseException:
+                with self._lock:
+                    self._rendering.pop(key, None)
+                raise
+            with self._lock:
+                self._entries[key] = entry
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                self._rendering.pop(key, None)
+            return entry
+
+    def find(self, etag):
+        """Look up an entry by its content hash"""
+        with self._lock:
+            for entry in self._entries.values():
+                if entry.etag == etag:
+                    return entry
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0
+        }
@@ -1,79 +1,231 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, request, jsonify, send_file, url_for
 import pandas as pd
+import json
+import os
 import numpy as np
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_absolute_error
-import matplotlib.pyplot as plt
+import hashlib
 import io
 import base64
+import threading
+import warnings
 
-from backend.app.anamaly_detection import EnergyAnalyzer  # Changed to direct import
+from baseline_index import BaselineIndex
+from chart_cache import ChartCache, render_consumption_chart
+from load_shifting import cheapest_hours, is_peak_hour
+from metrics import REGISTRY, TRAIN_DURATION, CallbackMetric, instrument_app, timed
+from model_registry import ModelRegistry
+from serving import WorkPool, handle_pool_errors, serve
 
-app = Flask(__name__)
+from anamaly_detection import EnergyAnalyzer
 
-# --------- Sample Historical Data (Replace with real dataset) ----------
-np.random.seed(42)
-data = pd.DataFrame({
-    'Timestamp': pd.date_range(start='2025-09-01', periods=100, freq='H'),
-    'Total_Energy_kWh': np.random.rand(100) * 2 + 0.5,
-    'Temperature_C': np.random.rand(100) * 10 + 15
-})
-
-# Feature Engineering
-data['Hour'] = data['Timestamp'].dt.hour
-data['DayOfWeek'] = data['Timestamp'].dt.dayofweek
-data['Month'] = data['Timestamp'].dt.month
+analysis = Blueprint('analysis', __name__)
 
 features = ['Hour', 'DayOfWeek', 'Month', 'Temperature_C']
-X = data[features]
-y = data['Total_Energy_kWh']
 
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-# Train Model
-model = RandomForestRegressor(n_estimators=100, random_state=42)
-model.fit(X_train, y_train)
+class AnalysisModel:
+    """Historical data, forest and pattern analyzer behind the analysis routes
+
+    Built on first use (see get_analysis()) rather than at import, so that
+    importing the module and creating the app stay fast.
+    """
+
+    def __init__(self, model_dir='models'):
+        # sklearn is only imported once a model is actually needed
+        from sklearn.ensemble import RandomForestRegressor
+        from sklearn.metrics import mean_absolute_error
+        from sklearn.model_selection import train_test_split
+
+        # --------- Sample Historical Data (Replace with real dataset) ----------
+        np.random.seed(42)
+        data = pd.DataFrame({
+            'Timestamp': pd.date_range(start='2025-09-01', periods=100, freq='H'),
+            'Total_Energy_kWh': np.random.rand(100) * 2 + 0.5,
+            'Temperature_C': np.random.rand(100) * 10 + 15
+        })
+
+        # Feature Engineering
+        data['Hour'] = data['Timestamp'].dt.hour
+        data['DayOfWeek'] = data['Timestamp'].dt.dayofweek
+        data['Month'] = data['Timestamp'].dt.month
+        self.data = data
+
+        # Per-hour and per-(hour, day-of-week) consumption baselines for O(1) historical average lookups
+        self.baseline_index = BaselineIndex.from_frame(data)
+
+        X = data[features]
+        y = data['Total_Energy_kWh']
+
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+        # Train Model, or load it from disk if this training data has been fit before
+        self.model_registry = ModelRegistry(model_dir)
+        with TRAIN_DURATION.time(model='energy_analysis_forest'):
+            self.model = self.model_registry.load_or_fit(
+                'energy_analysis_forest',
+                RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=-1),
+                X_train, y_train
+            )
+        # Fit on every core, but predict single rows without thread fan-out
+        self.model.set_params(n_jobs=None)
+
+        # Evaluate
+        preds_test = self.model.predict(X_test)
+        self.initial_mae = mean_absolute_error(y_test, preds_test)
+        print('Initial MAE:', self.initial_mae)
+
+        # Versions used to key cached charts; the model version is the registry's training data hash
+        self.data_version = hashlib.sha1(pd.util.hash_pandas_object(data, index=False).values).hexdigest()[:16]
+        self.model_version = self.model_registry.versions['energy_analysis_forest']
+
+        # Energy analyzer fitted once on the historical data so requests only score
+        self.energy_analyzer = EnergyAnalyzer().fit(pd.DataFrame({
+            'hour_of_day': data['Hour'],
+            'energy_usage': data['Total_Energy_kWh']
+        }))
+        self._lock = threading.Lock()
+
+    def add_readings(self, readings):
+        """Append new readings to the history, updating the baselines and data version incrementally"""
+        readings = readings.assign(
+            Hour=readings['Timestamp'].dt.hour,
+            DayOfWeek=readings['Timestamp'].dt.dayofweek,
+            Month=readings['Timestamp'].dt.month
+        )
+        columns = self.data.columns
+        readings_hash = pd.util.hash_pandas_object(readings[columns], index=False).values
+        with self._lock:
+            self.data = pd.concat([self.data, readings[columns]], ignore_index=True)
+            self.baseline_index.add_many(readings['Hour'].values, readings['DayOfWeek'].values,
+                                         readings['Total_Energy_kWh'].values)
+            self.data_version = hashlib.sha1(self.data_version.encode() + readings_hash.tobytes()).hexdigest()[:16]
+
+    def render_last_24h_chart(self):
+        """Render the last 24 hours of history against the model's predictions"""
+        last_24h = self.data.tail(24)
+        preds_hist = self.model.predict(last_24h[features])
+        return render_consumption_chart(
+            last_24h['Timestamp'].dt.strftime('%Y-%m-%d %H:%M'),
+            last_24h['Total_Energy_kWh'],
+            preds_hist,
+            pool=render_pool
+        )
+
 
-# Evaluate
-preds_test = model.predict(X_test)
-print('Initial MAE:', mean_absolute_error(y_test, preds_test))
+_analysis = None
+_analysis_lock = threading.Lock()
 
-# Create energy analyzer instance
-energy_analyzer = EnergyAnalyzer()
+def get_analysis():
+    """The shared AnalysisModel, built by whichever request (or warm-up) needs it first"""
+    global _analysis
+    if _analysis is None:
+        with _analysis_lock:
+            if _analysis is None:
+                _analysis = AnalysisModel()
+    return _analysis
+
+# Inference runs on threads (sklearn releases the GIL while predicting); chart rendering holds
+# the GIL, so it gets worker processes. Both are bounded and time out instead of piling up.
+inference_pool = WorkPool('inference', timeout=5)
+render_pool = WorkPool('render', timeout=30, processes=True)
+
+chart_cache = ChartCache()
+REGISTRY.register_cache('chart', chart_cache.stats)
+REGISTRY.register(CallbackMetric(
+    'model_mae', "Held-out mean absolute error of the forest (kWh)",
+    lambda: _analysis.initial_mae if _analysis is not None else float('nan')
+))
 
 # Helper: Generate consumption comparison chart (base64 image)
 def generate_consumption_chart(timestamps, actual, predicted):
-    plt.figure(figsize=(10,5))
-    plt.plot(timestamps, actual, label='Actual')
-    plt.plot(timestamps, predicted, label='Predicted', linestyle='dashed')
-    plt.xlabel('Timestamp')
-    plt.ylabel('Energy Consumption (kWh)')
-    plt.title('Actual vs Predicted Energy Consumption')
-    plt.legend()
-    plt.tight_layout()
-    
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    buf.seek(0)
-    img_base64 = base64.b64encode(buf.read()).decode('utf-8')
-    plt.close()
-    return img_base64
+    png = render_consumption_chart(timestamps, actual, predicted)
+    return base64.b64encode(png).decode('utf-8')
+
+# Helper: Load-shifting advice pointing at the cheapest start hour from the scheduler
+def shift_message(start_hour):
+    return f"Try shifting heavy appliance use to {start_hour:02d}:00, the cheapest time in the next 24 hours."
 
 # Helper: Generate recommendations based on hour and predicted vs historical average consumption
 def generate_recommendation(hour, predicted, historical_avg, threshold=1.2):
     recommendations = []
     if predicted > historical_avg * threshold:
         recommendations.append(f"Energy usage is {predicted/historical_avg:.2f} times higher than usual at hour {hour}.")
-        if 18 <= hour <= 22:
-            recommendations.append("Try shifting heavy appliance use to off-peak hours before 6 PM or after 10 PM.")
+        if is_peak_hour(hour):
+            recommendations.append(shift_message(cheapest_hours([hour])[0]))
         else:
             recommendations.append("Consider turning off unused devices or check for appliance faults.")
     else:
         recommendations.append("Energy use is within normal limits. Keep up the good habits!")
     return recommendations
 
-@app.route('/energy_analysis', methods=['POST'])
+# Helper: Vectorized generate_recommendation over many rows, including the anomaly alerts
+def generate_recommendations(hours, predicted, historical_avg, anomalies=None, threshold=1.2):
+    hours = np.asarray(hours)
+    predicted = np.asarray(predicted, dtype=float)
+    historical_avg = np.asarray(historical_avg, dtype=float)
+
+    high = predicted > historical_avg * threshold
+    peak = is_peak_hour(hours)
+    # Cheapest hour of the tariff within the next day, for every row at once
+    shift_to = cheapest_hours(hours)
+    ratio = predicted / historical_avg
+    anomalous = np.zeros(len(hours), dtype=bool) if anomalies is None else np.asarray(anomalies) == -1
+    above_avg = predicted > historical_avg
+
+    results = []
+    for i in range(len(hours)):
+        if high[i]:
+            recs = [f"Energy usage is {ratio[i]:.2f} times higher than usual at hour {hours[i]}."]
+            if peak[i]:
+                recs.append(shift_message(shift_to[i]))
+            else:
+                recs.append("Consider turning off unused devices or check for appliance faults.")
+        else:
+            recs = ["Energy use is within normal limits. Keep up the good habits!"]
+        if anomalous[i]:
+            recs.append("ALERT: Unusual energy consumption pattern detected!")
+            if above_avg[i]:
+                recs.append("Energy usage is significantly higher than expected. Please check for malfunctioning equipment.")
+            else:
+                recs.append("Energy usage is significantly lower than expected. This might indicate equipment shutdown or malfunction.")
+        results.append(recs)
+    return results
+
+# Helper: Naive local time for one timestamp; ones with a UTC offset are converted to local time first
+def local_timestamp(value):
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        timestamp = pd.Timestamp(timestamp.to_pydatetime().astimezone().replace(tzinfo=None))
+    return timestamp
+
+# Helper: Parse timestamps into a naive local-time DatetimeIndex, like ingestion.parse_sample does
+def parse_timestamps(values):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', FutureWarning)
+        try:
+            timestamps = pd.to_datetime(values)
+        except ValueError:
+            timestamps = None
+    # Offsets (or offsets mixed with naive times) would leave a tz-aware or object index
+    if not (isinstance(timestamps, pd.DatetimeIndex) and timestamps.tz is None):
+        timestamps = pd.DatetimeIndex([local_timestamp(v) for v in values])
+    if timestamps.hasnans:
+        raise ValueError("missing timestamp")
+    return timestamps
+
+# Helper: Read batch points from a JSON array ({"points": [...]} also accepted) or an NDJSON stream
+def read_batch_points():
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        return [json.loads(line) for line in request.stream if line.strip()]
+
+    input_json = request.get_json()
+    if isinstance(input_json, dict):
+        input_json = input_json.get('points')
+    if not isinstance(input_json, list):
+        raise ValueError("expected a JSON array of points")
+    return input_json
+
+@analysis.route('/energy_analysis', methods=['POST'])
 def analyze_energy():
     """
     Expects JSON:
@@ -81,14 +233,17 @@ def analyze_energy():
         "timestamp": "2025-09-27T19:00:00",
         "temperature_c": 23.5
     }
-    Responds with predicted consumption, recommendations, and consumption chart image.
+    Responds with predicted consumption, recommendations, and the URL of the consumption chart image.
     """
     input_json = request.get_json()
+    state = get_analysis()
 
     try:
-        timestamp = pd.to_datetime(input_json['timestamp'])
+        timestamp = local_timestamp(input_json['timestamp'])
         temperature_c = float(input_json['temperature_c'])
-    except (KeyError, ValueError):
+        if pd.isna(timestamp) or not np.isfinite(temperature_c):
+            raise ValueError("missing timestamp or non-finite temperature_c")
+    except (KeyError, TypeError, ValueError):
         return jsonify({"error": "Provide valid 'timestamp' and 'temperature_c' fields"}), 400
     
     hour = timestamp.hour
@@ -97,10 +252,11 @@ def analyze_energy():
     
     # Predict energy consumption
     features_input = np.array([[hour, dayofweek, month, temperature_c]])
-    predicted_energy = model.predict(features_input)[0]
+    with timed('predict'):
+        predicted_energy = inference_pool.run(state.model.predict, features_input)[0]
     
-    # Calculate historical average consumption for this hour to compare
-    hist_avg = data.loc[data['Hour'] == hour, 'Total_Energy_kWh'].mean()
+    # Look up historical average consumption for this hour and weekday (or just the hour) to compare
+    hist_avg = state.baseline_index.hourly_dow_average(hour, dayofweek)
 
     # Generate recommendations
     recs = generate_recommendation(hour, predicted_energy, hist_avg)
@@ -111,10 +267,11 @@ def analyze_energy():
         'energy_usage': [predicted_energy]
     })
     
-    analysis_results = energy_analyzer.analyze(recent_data)
+    with timed('anomaly_score'):
+        analysis_results = inference_pool.run(state.energy_analyzer.score, recent_data)
     
     # Check for anomalies
-    anomaly_detected = analysis_results['anomalies'][0] == -1
+    anomaly_detected = bool(analysis_results['anomalies'][0] == -1)
     if anomaly_detected:
         recs.append("ALERT: Unusual energy consumption pattern detected!")
         if predicted_energy > hist_avg:
@@ -122,23 +279,153 @@ def analyze_energy():
         else:
             recs.append("Energy usage is significantly lower than expected. This might indicate equipment shutdown or malfunction.")
     
-    # Generate chart for last 24 hours from historical data
-    last_24h = data.tail(24)
-    preds_hist = model.predict(last_24h[features].values)
-    chart_base64 = generate_consumption_chart(
-        last_24h['Timestamp'].dt.strftime('%Y-%m-%d %H:%M'),
-        last_24h['Total_Energy_kWh'],
-        preds_hist
-    )
+    # Chart for last 24 hours from historical data, only rendered when data or model change
+    chart = chart_cache.get_or_render(state.data_version, state.model_version, state.render_last_24h_chart)
     
     return jsonify({
         "predicted_energy_kwh": round(predicted_energy, 3),
         "recommendations": recs,
-        "consumption_chart_base64": chart_base64,
+        "consumption_chart_url": url_for('.consumption_chart', chart_hash=chart.etag),
+        "consumption_chart_hash": chart.etag,
         "anomaly_detected": anomaly_detected,
-        "pattern_cluster": analysis_results['clusters'][0]
+        "pattern_cluster": int(analysis_results['clusters'][0])
+    })
+
+@analysis.route('/energy_analysis/batch', methods=['POST'])
+def analyze_energy_batch():
+    """
+    Expects a JSON array (or NDJSON stream, one point per line) of:
+    {
+        "timestamp": "2025-09-27T19:00:00",
+        "temperature_c": 23.5
+    }
+    Responds with one result per point, in input order, scored with a single model call.
+    """
+    try:
+        points = read_batch_points()
+        timestamps = parse_timestamps([p['timestamp'] for p in points])
+        temperatures = np.array([p['temperature_c'] for p in points], dtype=float)
+        # null or non-numeric temperatures become NaN, which the model can't score
+        if not np.isfinite(temperatures).all():
+            raise ValueError("non-finite temperature_c")
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "Provide an array of points with valid 'timestamp' and 'temperature_c' fields"}), 400
+
+    if len(points) == 0:
+        return jsonify({"results": [], "count": 0})
+
+    state = get_analysis()
+    hours = timestamps.hour.values
+    features_input = pd.DataFrame({
+        'Hour': hours,
+        'DayOfWeek': timestamps.dayofweek.values,
+        'Month': timestamps.month.values,
+        'Temperature_C': temperatures
     })
+    with timed('predict'):
+        predicted_energy = inference_pool.run(state.model.predict, features_input[features])
+
+    # Historical average consumption per hour and weekday, looked up for every point at once
+    hist_avg = state.baseline_index.hourly_dow_average(hours, timestamps.dayofweek.values)
+
+    with timed('anomaly_score'):
+        analysis_results = inference_pool.run(state.energy_analyzer.score, pd.DataFrame({
+            'hour_of_day': hours,
+            'energy_usage': predicted_energy
+        }))
+    anomalies = analysis_results['anomalies']
+    clusters = analysis_results['clusters']
+
+    recs = generate_recommendations(hours, predicted_energy, hist_avg, anomalies)
+
+    results = [
+        {
+            "timestamp": timestamps[i].isoformat(),
+            "predicted_energy_kwh": round(float(predicted_energy[i]), 3),
+            "recommendations": recs[i],
+            "anomaly_detected": bool(anomalies[i] == -1),
+            "pattern_cluster": int(clusters[i])
+        }
+        for i in range(len(points))
+    ]
+    return jsonify({"results": results, "count": len(results)})
+
+@analysis.route('/energy_analysis/readings', methods=['POST'])
+def ingest_readings():
+    """
+    Expects a JSON array (or NDJSON stream) of measured readings:
+    {
+        "timestamp": "2025-09-27T19:00:00",
+        "energy_kwh": 1.42,
+        "temperature_c": 23.5
+    }
+    """
+    try:
+        points = read_batch_points()
+        readings = pd.DataFrame({
+            'Timestamp': parse_timestamps([p['timestamp'] for p in points]),
+            'Total_Energy_kWh': np.array([p['energy_kwh'] for p in points], dtype=float),
+            'Temperature_C': np.array([p['temperature_c'] for p in points], dtype=float)
+        })
+        # NaN or infinite values would poison the baselines and the data every later request reads
+        if not np.isfinite(readings[['Total_Energy_kWh', 'Temperature_C']].values).all():
+            raise ValueError("non-finite reading")
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "Provide an array of readings with valid 'timestamp', 'energy_kwh' and 'temperature_c' fields"}), 400
+
+    state = get_analysis()
+    state.add_readings(readings)
+    return jsonify({"accepted": len(readings), "total_readings": len(state.data), "data_version": state.data_version})
+
+@analysis.route('/energy_analysis/chart/<chart_hash>.png')
+def consumption_chart(chart_hash):
+    """Serve a cached consumption chart; the URL is content-addressed so it never changes"""
+    chart = chart_cache.find(chart_hash)
+    if chart is None:
+        return jsonify({"error": "Chart not found"}), 404
+
+    return send_file(
+        io.BytesIO(chart.png),
+        mimetype='image/png',
+        etag=chart.etag,
+        last_modified=chart.last_modified,
+        max_age=31536000,
+        conditional=True
+    )
+
+@analysis.route('/ready')
+def ready():
+    """Readiness probe: 503 until the model has been built"""
+    if _analysis is None:
+        return jsonify({"ready": False}), 503
+    return jsonify({"ready": True, "model_version": _analysis.model_version, "data_version": _analysis.data_version})
+
+def warm_up():
+    """Build the model and render the current chart, so the first request finds both ready"""
+    state = get_analysis()
+    chart_cache.get_or_render(state.data_version, state.model_version, state.render_last_24h_chart)
+
+def create_app(warm=False):
+    """Build the Flask app; with warm=True the model and first chart are built in the background"""
+    app = Flask(__name__)
+    instrument_app(app, 'energy_analysis')
+    handle_pool_errors(app)
+    app.register_blueprint(analysis)
+    if warm:
+        threading.Thread(target=warm_up, name='analysis-warmup', daemon=True).start()
+    return app
+
+def __getattr__(name):
+    # `energy_analysis.app` (e.g. `flask --app energy_analysis:app`) builds an app on first access
+    if name == 'app':
+        globals()['app'] = create_app()
+        return globals()['app']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == '__main__':
-    app.run(debug=True)
-    app.run(debug=True)
+    app = create_app(warm=True)
+    # Port 5001 so this can run next to the EMS service on 5000
+    if os.environ.get('EMS_DEBUG'):
+        app.run(debug=True, port=5001)
+    else:
+        serve(app, host='127.0.0.1', port=5001)
@@ -0,0 +1,282 @@
+import contextlib
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+from metrics import REGISTRY, CallbackMetric, timed
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteConnectionPool:
+    """Fixed-size pool of persistent SQLite connections in WAL mode"""
+
+    def __init__(self, path, size=4, timeout=30):
+        self.path = path
+        self.size = size
+        self._closed = False
+        self._connections = queue.Queue(maxsize=size)
+        for _ in range(size):
+            conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._connections.put(conn)
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Borrow a connection; commits on success and rolls back on error"""
+        conn = None
+        while conn is None:
+            if self._closed:
+                raise RuntimeError("SQLiteConnectionPool is closed")
+            try:
+                conn = self._connections.get(timeout=0.5)
+            except queue.Empty:
+                pass
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            # Connections handed back after close() are closed rather than pooled
+            if self._closed:
+                conn.close()
+            else:
+                self._connections.put(conn)
+                if self._closed:
+                    self._drain()
+
+    def close(self):
+        self._closed = True
+        self._drain()
+
+    def _drain(self):
+        while True:
+            try:
+                self._connections.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class EnergyLogWriter:
+    """Write-behind queue for energy_logs rows
+
+    Rows are committed in groups of up to `batch_size`, or after
+    `flush_interval` seconds, by a single background thread. write() only
+    enqueues, so callers never wait on disk unless the queue is full. A
+    batch that fails to commit is retried with backoff; if it still fails
+    its rows are counted in rows_failed (and energy_log_rows_failed_total).
+    """
+
+    # Rows dropped after every retry failed, across all writers in the process
+    total_rows_failed = 0
+    _failed_lock = threading.Lock()
+
+    INSERT_SQL = """
+        INSERT INTO energy_logs (timestamp, appliance_id, power_consumption, status)
+        VALUES (?, ?, ?, ?)
+    """
+
+    def __init__(self, pool, batch_size=500, flush_interval=0.05, max_queue=100000, retries=3, retry_delay=0.1):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.rows_written = 0
+        self.batches_written = 0
+        self.rows_failed = 0
+        self.last_error = None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='energy-log-writer', daemon=True)
+        self._thread.start()
+
+    def write(self, timestamp, appliance_id, power_consumption, status):
+        """Queue one log row; blocks only when the queue is full (backpressure)"""
+        if self._closed:
+            raise RuntimeError("EnergyLogWriter is closed")
+        self._queue.put((timestamp, appliance_id, power_consumption, status))
+
+    def write_many(self, rows):
+        for row in rows:
+            self.write(*row)
+
+    def _run(self):
+        while True:
+            row = self._queue.get()
+            if row is None:
+                self._queue.task_done()
+                return
+
+            batch = [row]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    row = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if row is None:
+                    stop = True
+                    break
+                batch.append(row)
+
+            self._commit(batch)
+            for _ in range(len(batch) + (1 if stop else 0)):
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _commit(self, batch):
+        for attempt in range(self.retries + 1):
+            try:
+                with timed('sqlite_write'), self.pool.connection() as conn:
+                    conn.executemany(self.INSERT_SQL, batch)
+                self.rows_written += len(batch)
+                self.batches_written += 1
+                return
+            except Exception as e:
+                self.last_error = str(e)
+                if attempt < self.retries:
+                    # Mostly "database is locked" or a full disk; give it a moment before retrying
+                    time.sleep(self.retry_delay * 2 ** attempt)
+
+        self.rows_failed += len(batch)
+        with EnergyLogWriter._failed_lock:
+            EnergyLogWriter.total_rows_failed += len(batch)
+        logger.error("Dropped %d energy_logs rows after %d attempts: %s", len(batch), self.retries + 1, self.last_error)
+
+    def flush(self):
+        """Block until every queued row has been committed"""
+        self._queue.join()
+
+    def close(self):
+        """Flush pending rows and stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "rows_written": self.rows_written,
+            "batches_written": self.batches_written,
+            "rows_failed": self.rows_failed,
+            "last_error": self.last_error
+        }
+
+
+REGISTRY.register(CallbackMetric(
+    'energy_log_rows_failed_total', "energy_logs rows dropped after every commit retry failed",
+    lambda: EnergyLogWriter.total_rows_failed, type='counter'))
+
+
+class EnergyLogQuery:
+    """Read side of energy_logs: range, per-appliance and downsampled queries
+
+    Pages are keyset-paginated on (timestamp, id), so every page is an index
+    range scan no matter how deep into the log it starts.
+    """
+
+    INDEX_SQL = [
+        "CREATE INDEX IF NOT EXISTS idx_energy_logs_timestamp ON energy_logs (timestamp, id)",
+        "CREATE INDEX IF NOT EXISTS idx_energy_logs_appliance_timestamp ON energy_logs (appliance_id, timestamp, id)"
+    ]
+
+    BUCKETS = {
+        'hour': 13,  # 'YYYY-MM-DDTHH'
+        'day': 10    # 'YYYY-MM-DD'
+    }
+
+    COLUMNS = ['id', 'timestamp', 'appliance_id', 'power_consumption', 'status']
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def create_indexes(self):
+        with self.pool.connection() as conn:
+            for sql in self.INDEX_SQL:
+                conn.execute(sql)
+
+    @staticmethod
+    def encode_cursor(row):
+        return f"{row['timestamp']}|{row['id']}"
+
+    @staticmethod
+    def decode_cursor(cursor):
+        timestamp, _, row_id = cursor.rpartition('|')
+        return timestamp, int(row_id)
+
+    def logs(self, start=None, end=None, appliance_id=None, limit=100, cursor=None):
+        """Return one page of log rows ordered by (timestamp, id) and the cursor for the next page"""
+        clauses, params = self._where(start, end, appliance_id)
+        if cursor:
+            clauses.append("(timestamp, id) > (?, ?)")
+            params.extend(self.decode_cursor(cursor))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        sql = f"""
+            SELECT {', '.join(self.COLUMNS)} FROM energy_logs
+            {where}
+            ORDER BY timestamp, id
+            LIMIT ?
+        """
+        with self.pool.connection() as conn:
+            rows = conn.execute(sql, params + [limit + 1]).fetchall()
+
+        rows = [dict(zip(self.COLUMNS, row)) for row in rows]
+        next_cursor = self.encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        return rows[:limit], next_cursor
+
+    def aggregate(self, bucket='hour', start=None, end=None, appliance_id=None):
+        """Downsample logs into hourly or daily buckets"""
+        if bucket not in self.BUCKETS:
+            raise ValueError(f"bucket must be one of {sorted(self.BUCKETS)}")
+
+        clauses, params = self._where(start, end, appliance_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"""
+            SELECT substr(timestamp, 1, {self.BUCKETS[bucket]}) AS bucket,
+                   COUNT(*), AVG(power_consumption), MIN(power_consumption), MAX(power_consumption)
+            FROM energy_logs
+            {where}
+            GROUP BY bucket
+            ORDER BY bucket
+        """
+        with self.pool.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+
+        return [
+            {
+                "bucket": row[0],
+                "count": row[1],
+                "avg_power": row[2],
+                "min_power": row[3],
+                "max_power": row[4]
+            }
+            for row in rows
+        ]
+
+    @staticmethod
+    def _where(start, end, appliance_id):
+        clauses, params = [], []
+        if appliance_id is not None:
+            clauses.append("appliance_id = ?")
+            params.append(appliance_id)
+        if start:
+            clauses.append("timestamp >= ?")
+            params.append(start)
+        if end:
+            clauses.append("timestamp < ?")
+            params.append(end)
+        return clauses, params
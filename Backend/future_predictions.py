@@ -1,51 +1,170 @@
-import json
+import os
+import threading
 import datetime
 from datetime import timedelta
 import random
 import numpy as np
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, abort, g, has_app_context, request, jsonify, stream_with_context
+from werkzeug.local import LocalProxy
 from flask_cors import CORS
-import sqlite3
-import pandas as pd
-from sklearn.preprocessing import MinMaxScaler
-from sklearn.ensemble import RandomForestRegressor, IsolationForest
+import atexit
 import warnings
 warnings.filterwarnings('ignore')
 
-app = Flask(__name__)
-CORS(app)
+from appliances import ApplianceRegistry
+from broadcast import BroadcastHub, Publisher
+from history_store import history_path_for, load_site_data
+from energy_logs import EnergyLogQuery, EnergyLogWriter, SQLiteConnectionPool
+from ingestion import ReadingIngestor
+from load_shifting import plan_sites
+from metrics import REGISTRY, TRAIN_DURATION, instrument_app, timed
+from model_registry import ModelRegistry
+from online_anomaly import OnlineAnomalyDetector
+from response_cache import ResponseCache
+from retraining import RetrainScheduler
+from rollups import HistoryRollups
+from serving import WorkPool, handle_pool_errors, serve
+from sites import SiteManager
+from timeseries import DailySeries
+from training_pipeline import fit_site_models, make_anomaly_detector, make_prediction_model
+
+# Routes that are only served once, and the /api routes, which are also served per site
+root = Blueprint('root', __name__)
+api = Blueprint('api', __name__)
 
 class EnergyManagementSystem:
-    def __init__(self):
-        self.appliances = []
-        self.historical_data = []
+    def __init__(self, retrain_interval=3600, data_path='energy_data.json',
+                 db_path='energy_management.db', model_dir='models', history_path=None):
+        self.data_path = data_path
+        self.history_path = history_path or history_path_for(data_path)
+        self.state_version = 0
+        self.events = BroadcastHub()
+        self._publish_lock = threading.Lock()
+        self._pushed = {"summary": None, "alerts": set()}
+        self.publisher = Publisher(self.publish_updates)
+        self.appliances = ApplianceRegistry()
+        self.historical_data = DailySeries()
         self.load_sample_data()
+        self._rollups = None
+        self._rollups_lock = threading.Lock()
+        self.db_pool = SQLiteConnectionPool(db_path)
+        self.log_query = EnergyLogQuery(self.db_pool)
         self.init_database()
-        self.prediction_model = RandomForestRegressor(n_estimators=100, random_state=42)
-        self.anomaly_detector = IsolationForest(contamination=0.1, random_state=42)
-        self.train_models()
+        self.log_writer = EnergyLogWriter(self.db_pool)
+        self.model_registry = ModelRegistry(model_dir)
+
+        # Unfitted until the first background training finishes; predictions fall back to averages
+        self._models = (self.make_prediction_model(), self.make_anomaly_detector())
+        self._forecast_cache = None
+        self.retrainer = RetrainScheduler(self.train_models, interval=retrain_interval)
+        self.retrainer.request()
+        self.retrainer.start()
+
+        self.online_detector = OnlineAnomalyDetector(refresh_every=50000)
+        self.ingestor = ReadingIngestor(self)
+        self.ingestor.observers.append(self.online_detector.observe_batch)
+
+    def close(self):
+        """Stop background work and flush pending writes (used when a site is evicted)"""
+        # Drain queued readings first: closing a day they cross still writes history and requests a retrain
+        self.ingestor.close()
+        self.retrainer.stop(wait=False)
+        self.publisher.close()
+        self.online_detector.close()
+        self.log_writer.close()
+        self.db_pool.close()
+
+    @property
+    def rollups(self):
+        """History aggregates, built on first use so opening a long history stays cheap"""
+        if self._rollups is None:
+            with self._rollups_lock:
+                if self._rollups is None:
+                    self._rollups = HistoryRollups.from_records(self.historical_data.to_records())
+        return self._rollups
+
+    def bump_state_version(self):
+        """Mark cached responses stale after any change to appliances, data or models"""
+        self.state_version += 1
+        # Stream subscribers are updated from the publisher thread, not the caller's
+        self.publisher.request()
+
+    def live_summary(self):
+        current_consumption = self.appliances.active_load / 1000
+        return {
+            "current_consumption": round(current_consumption, 2),
+            "active_appliances": self.appliances.active_count,
+            "total_appliances": len(self.appliances),
+            "estimated_daily_cost": round(current_consumption * 24 * 0.12, 2)
+        }
+
+    def publish_updates(self):
+        """Push dashboard deltas to stream subscribers, only for the parts that changed"""
+        if not len(self.events):
+            return
+
+        with self._publish_lock:
+            summary = self.live_summary()
+            if summary != self._pushed['summary']:
+                self.events.publish('consumption', summary)
+                self._pushed['summary'] = summary
+
+            for appliance_id, status, previous_status in self.appliances.drain_changes():
+                self.events.publish('appliance', {"id": appliance_id, "status": status, "previous_status": previous_status})
+
+            alerts = {(a['type'], a['title'], a.get('appliance_id')): a for a in self.get_alerts()}
+            for key, alert in alerts.items():
+                if key not in self._pushed['alerts']:
+                    self.events.publish('alert', alert)
+            self._pushed['alerts'] = set(alerts)
+
+    def subscribe(self):
+        """Open a stream subscription primed with a snapshot of the current state"""
+        subscription = self.events.subscribe()
+        with self._publish_lock:
+            if self._pushed['summary'] is None:
+                self._pushed['summary'] = self.live_summary()
+                self._pushed['alerts'] = {(a['type'], a['title'], a.get('appliance_id')) for a in self.get_alerts()}
+                self.appliances.drain_changes()
+            subscription.push(self.events.encode('snapshot', {
+                **self._pushed['summary'],
+                "appliances": {a['id']: a['status'] for a in self.appliances}
+            }))
+        return subscription
+
+    @property
+    def prediction_model(self):
+        return self._models[0]
+
+    @property
+    def anomaly_detector(self):
+        return self._models[1]
+
+    def make_prediction_model(self):
+        return make_prediction_model()
+
+    def make_anomaly_detector(self):
+        return make_anomaly_detector()
 
     def load_sample_data(self):
-        """Load sample data from JSON file"""
+        """Load sample data from the columnar history store, or stream it from the JSON file"""
         try:
-            with open('energy_data.json', 'r') as f:
-                data = json.load(f)
-                self.appliances = data['appliances']
-                self.historical_data = data['historical_data']
+            appliances, self.historical_data = load_site_data(self.data_path, self.history_path)
+            self.appliances = ApplianceRegistry(appliances)
         except FileNotFoundError:
             self.generate_sample_data()
 
     def generate_sample_data(self):
         """Generate sample appliance and historical data"""
-        self.appliances = [
+        self.appliances = ApplianceRegistry([
             {"id": 1, "name": "Smart AC", "type": "HVAC", "power_rating": 3500, "status": "on"},
             {"id": 2, "name": "LED Lights", "type": "Lighting", "power_rating": 150, "status": "on"},
             {"id": 3, "name": "Refrigerator", "type": "Kitchen", "power_rating": 400, "status": "on"},
             {"id": 4, "name": "Smart TV", "type": "Entertainment", "power_rating": 250, "status": "off"},
             {"id": 5, "name": "Water Heater", "type": "Utility", "power_rating": 4500, "status": "on"}
-        ]
+        ])
 
-        self.historical_data = []
+        self.historical_data = DailySeries()
         base_date = datetime.datetime.now() - timedelta(days=30)
         for i in range(30):
             current_date = base_date + timedelta(days=i)
@@ -57,71 +176,112 @@ class EnergyManagementSystem:
                 "carbon_footprint": round(consumption * 0.4, 2)
             })
 
+    def add_historical_record(self, record):
+        """Append one daily record, keeping the rollups in step"""
+        with self._rollups_lock:
+            self.historical_data.append(record)
+            if self._rollups is not None:
+                self._rollups.add(record)
+        self.bump_state_version()
+
     def init_database(self):
         """Initialize SQLite database"""
-        conn = sqlite3.connect('energy_management.db')
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS energy_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT,
-                appliance_id INTEGER,
-                power_consumption REAL,
-                status TEXT
-            )
-        """)
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_goals (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                goal_type TEXT,
-                target_value REAL,
-                current_value REAL,
-                created_at TEXT
-            )
-        """)
-
-        conn.commit()
-        conn.close()
+        with self.db_pool.connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS energy_logs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp TEXT,
+                    appliance_id INTEGER,
+                    power_consumption REAL,
+                    status TEXT
+                )
+            """)
+
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS user_goals (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    goal_type TEXT,
+                    target_value REAL,
+                    current_value REAL,
+                    created_at TEXT
+                )
+            """)
+
+        self.log_query.create_indexes()
 
     def train_models(self):
         """Train AI models for prediction and anomaly detection"""
-        if len(self.historical_data) < 7:
-            return
-
-        df = pd.DataFrame(self.historical_data)
-        df['date'] = pd.to_datetime(df['date'])
-        df['day_of_week'] = df['date'].dt.dayofweek
-        df['day_of_month'] = df['date'].dt.day
-
-        features = ['day_of_week', 'day_of_month']
-        X = df[features].values
-        y = df['consumption'].values
-
-        self.prediction_model.fit(X, y)
-
-        consumption_reshaped = df['consumption'].values.reshape(-1, 1)
-        self.anomaly_detector.fit(consumption_reshaped)
+        # Slicing shares the buffers but fixes the length, so appends during the fit are not seen
+        with TRAIN_DURATION.time(model='ems'):
+            models = self.fit_models(self.historical_data[:])
+        if models is not None:
+            # Swap both models in with a single assignment so readers never see a half-trained pair
+            self._models = models
+            self.bump_state_version()
+
+    def fit_models(self, historical_data):
+        """Fit fresh prediction and anomaly models on a snapshot of the history"""
+        return fit_site_models(self.model_registry, historical_data)
 
     def predict_consumption(self, days_ahead=1):
-        """Predict energy consumption for future days"""
-        future_date = datetime.datetime.now() + timedelta(days=days_ahead)
-        features = [future_date.weekday(), future_date.day]
+        """Predict energy consumption for future days (0 is today)"""
+        if days_ahead >= 1:
+            return self.forecast(days_ahead)['prediction'][days_ahead - 1]
+        # The forecast starts tomorrow, so today (or an earlier day) is predicted on its own
+        date = datetime.date.today() + timedelta(days=days_ahead)
+        try:
+            return max(0, float(self.prediction_model.predict([[date.weekday(), date.day]])[0]))
+        except AttributeError:
+            return float(np.mean(self.historical_data.column('consumption')[-7:]))
+
+    def forecast(self, horizon=30, interval=0.9):
+        """Forecast every day 1..horizon in one vectorized pass
+
+        Prediction intervals come from the spread of the per-tree estimates.
+        Results are cached until the models are swapped or the date changes.
+        """
+        models = self._models
+        today = datetime.date.today()
+        cached = self._forecast_cache
+        if cached is not None and cached[0] is models and cached[1] == today \
+                and cached[2] == interval and len(cached[3]['prediction']) >= horizon:
+            return {key: values[:horizon] for key, values in cached[3].items()}
+
+        dates = [today + timedelta(days=d) for d in range(1, horizon + 1)]
+        X = np.array([[date.weekday(), date.day] for date in dates])
 
         try:
-            prediction = self.prediction_model.predict([features])[0]
-            return max(0, prediction)
-        except:
-            recent_avg = np.mean([d['consumption'] for d in self.historical_data[-7:]])
-            return recent_avg
+            with timed('predict'):
+                per_tree = np.stack([tree.predict(X) for tree in models[0].estimators_])
+            tail = (1 - interval) / 2 * 100
+            result = {
+                "date": [date.isoformat() for date in dates],
+                "prediction": np.maximum(0, per_tree.mean(axis=0)).tolist(),
+                "lower": np.maximum(0, np.percentile(per_tree, tail, axis=0)).tolist(),
+                "upper": np.maximum(0, np.percentile(per_tree, 100 - tail, axis=0)).tolist()
+            }
+        except AttributeError:
+            # Model not trained yet: fall back to the recent average with a flat +/-15% band
+            recent_avg = float(np.mean(self.historical_data.column('consumption')[-7:]))
+            return {
+                "date": [date.isoformat() for date in dates],
+                "prediction": [recent_avg] * horizon,
+                "lower": [recent_avg * 0.85] * horizon,
+                "upper": [recent_avg * 1.15] * horizon
+            }
+
+        self._forecast_cache = (models, today, interval, result)
+        return result
 
     def detect_anomalies(self, consumption_value):
         """Detect if current consumption is anomalous"""
         try:
-            anomaly_score = self.anomaly_detector.decision_function([[consumption_value]])[0]
-            is_anomaly = self.anomaly_detector.predict([[consumption_value]])[0] == -1
-            return {"is_anomaly": is_anomaly, "score": anomaly_score}
+            # IsolationForest.predict is decision_function < 0, so one traversal gives both
+            with timed('anomaly_score'):
+                anomaly_score = float(self.anomaly_detector.decision_function([[consumption_value]])[0])
+            return {"is_anomaly": anomaly_score < 0, "score": anomaly_score}
         except:
             return {"is_anomaly": False, "score": 0}
 
@@ -139,27 +299,92 @@ class EnergyManagementSystem:
                 "difficulty": "easy"
             })
 
-        if 14 <= current_hour <= 18:
+        # Deferrable appliances get the start time the scheduler found cheapest versus running now
+        for item in self.load_shift_plan(current_hour):
+            if item['savings'] <= 0:
+                continue
             recommendations.append({
                 "type": "load_shifting",
-                "title": "Peak Hour Load Shifting",
-                "description": "Delay washing machine and dishwasher until after 6 PM",
-                "potential_savings": "8-10%",
+                "title": f"Schedule {item['appliance']}",
+                "description": f"Start at {item['start_hour'] % 24:02d}:00 instead of "
+                               f"{item['baseline_start_hour'] % 24:02d}:00 to save ${item['savings']:.2f} per run",
+                "potential_savings": f"{round(100 * item['savings'] / item['baseline_cost'])}%",
                 "difficulty": "medium"
             })
 
-        for appliance in self.appliances:
-            if appliance['type'] == 'HVAC' and appliance['status'] == 'on':
-                recommendations.append({
-                    "type": "efficiency",
-                    "title": f"Optimize {appliance['name']}",
-                    "description": "Use programmable schedules and adjust setpoints based on occupancy",
-                    "potential_savings": "15-20%",
-                    "difficulty": "easy"
-                })
+        for appliance in self.appliances.active_of_type('HVAC'):
+            if len(recommendations) >= 5:
+                break
+            recommendations.append({
+                "type": "efficiency",
+                "title": f"Optimize {appliance['name']}",
+                "description": "Use programmable schedules and adjust setpoints based on occupancy",
+                "potential_savings": "15-20%",
+                "difficulty": "easy"
+            })
 
         return recommendations[:5]
 
+    def load_shift_plan(self, current_hour=None, prices=None):
+        """Cheapest start time for each deferrable appliance over the next day"""
+        if current_hour is None:
+            current_hour = datetime.datetime.now().hour
+        return plan_sites([list(self.appliances)], prices, current_hour)[0]
+
+    def get_alerts(self):
+        """Build the current system alerts and notifications"""
+        alerts = []
+
+        current_consumption = self.appliances.active_load / 1000
+        avg_consumption = np.mean(self.historical_data.column('consumption')[-7:])
+
+        if current_consumption > avg_consumption * 1.3:
+            alerts.append({
+                "id": 1,
+                "type": "warning",
+                "title": "High Energy Consumption Detected",
+                "message": "Current consumption is 30% above normal. Consider turning off non-essential appliances.",
+                "timestamp": datetime.datetime.now().isoformat(),
+                "actionable": True
+            })
+
+        if datetime.datetime.now().hour > 23 or datetime.datetime.now().hour < 6:
+            running = self.appliances.active_of_type('Entertainment') + self.appliances.active_of_type('Kitchen')
+            for appliance in sorted(running, key=lambda a: a['id']):
+                alerts.append({
+                    "id": len(alerts) + 1,
+                    "type": "info",
+                    "title": f"{appliance['name']} Still Running",
+                    "message": f"Consider turning off {appliance['name']} to save energy during off-hours.",
+                    "timestamp": datetime.datetime.now().isoformat(),
+                    "actionable": True,
+                    "appliance_id": appliance['id']
+                })
+
+        for event in self.online_detector.recent_events(5):
+            appliance = self.appliances.get(event['appliance_id'])
+            name = appliance['name'] if appliance else f"Appliance {event['appliance_id']}"
+            alerts.append({
+                "id": len(alerts) + 1,
+                "type": "anomaly",
+                "title": f"Unusual Power Draw on {name}",
+                "message": f"{name} drew {event['power_w']:.0f} W, far from its usual level for this hour.",
+                "timestamp": event['timestamp'],
+                "actionable": True,
+                "appliance_id": event['appliance_id']
+            })
+
+        alerts.append({
+            "id": len(alerts) + 1,
+            "type": "maintenance",
+            "title": "AC Filter Maintenance",
+            "message": "Smart AC filter may need cleaning. Clean filters improve efficiency by 15%.",
+            "timestamp": datetime.datetime.now().isoformat(),
+            "actionable": False
+        })
+
+        return alerts
+
     def calculate_carbon_footprint(self, consumption_kwh):
         """Calculate carbon footprint based on energy consumption"""
         return round(consumption_kwh * 0.4, 2)
@@ -173,9 +398,56 @@ class EnergyManagementSystem:
         return min(100, max(0, 100 - efficiency))
 
 # Initialize the energy management system
-ems = EnergyManagementSystem()
-
-@app.route('/')
+# One EnergyManagementSystem per site, loaded on first use. The default site
+# keeps the original files in the working directory; other sites live in
+# sites/<site_id>/ and are reached through /api/sites/<site_id>/...
+DEFAULT_SITE = 'default'
+SITES_ROOT = 'sites'
+
+def load_site(site_id):
+    if site_id == DEFAULT_SITE:
+        return EnergyManagementSystem()
+
+    site_dir = os.path.join(SITES_ROOT, site_id)
+    if not os.path.isdir(site_dir):
+        raise KeyError(site_id)
+    return EnergyManagementSystem(
+        data_path=os.path.join(site_dir, 'energy_data.json'),
+        db_path=os.path.join(site_dir, 'energy_management.db'),
+        model_dir=os.path.join(site_dir, 'models')
+    )
+
+sites = SiteManager(load_site, max_active=int(os.environ.get('EMS_MAX_ACTIVE_SITES', 100)))
+
+def current_site():
+    """The EnergyManagementSystem for the site this request is scoped to"""
+    if not has_app_context():
+        return sites.get(DEFAULT_SITE)
+    if 'ems' not in g:
+        try:
+            # Held until the app context ends (release_site), so eviction can't close it mid-request
+            g.ems = sites.acquire(g.get('site_id', DEFAULT_SITE))
+        except KeyError:
+            abort(404, description="Unknown site")
+    return g.ems
+
+def release_site(exc):
+    site = g.pop('ems', None)
+    if site is not None:
+        sites.release(site)
+
+ems = LocalProxy(current_site)
+# Model inference runs on a bounded thread pool so a burst of forecasts can't occupy every request thread
+inference_pool = WorkPool('ems_inference', timeout=5)
+response_cache = ResponseCache(lambda: ems.state_version)
+REGISTRY.register_cache('response', response_cache.stats)
+
+@api.url_value_preprocessor
+def pull_site_id(endpoint, values):
+    if values and 'site_id' in values:
+        g.site_id = values.pop('site_id')
+
+@root.route('/')
 def home():
     """Home page with basic info"""
     return jsonify({
@@ -185,29 +457,40 @@ def home():
             "/api/dashboard",
             "/api/appliances", 
             "/api/predictions",
+            "/api/forecast",
             "/api/recommendations",
+            "/api/schedule",
             "/api/gamification",
-            "/api/control/<appliance_id>"
+            "/api/control/<appliance_id>",
+            "/api/models/retrain",
+            "/api/logs",
+            "/api/logs/appliance/<appliance_id>",
+            "/api/logs/aggregate",
+            "/api/historical/rollups",
+            "/api/ingest",
+            "/api/stream",
+            "/api/sites",
+            "/api/sites/<site_id>/..."
         ]
     })
 
-@app.route('/api/dashboard')
+@api.route('/dashboard')
+@response_cache.cached(ttl=10)
 def dashboard():
     """Main dashboard data endpoint"""
     current_time = datetime.datetime.now()
 
-    active_appliances = [a for a in ems.appliances if a['status'] == 'on']
-    current_consumption = sum(a['power_rating'] for a in active_appliances) / 1000
+    current_consumption = ems.appliances.active_load / 1000
 
-    recent_data = ems.historical_data[-7:] if len(ems.historical_data) >= 7 else ems.historical_data
-    historical_avg = np.mean([d['consumption'] for d in recent_data]) if recent_data else 45
+    recent_data = ems.historical_data.column('consumption')[-7:]
+    historical_avg = np.mean(recent_data) if len(recent_data) else 45
 
-    anomaly_result = ems.detect_anomalies(current_consumption)
+    anomaly_result = inference_pool.run(ems.detect_anomalies, current_consumption)
 
     dashboard_data = {
         "timestamp": current_time.isoformat(),
         "current_consumption": round(current_consumption, 2),
-        "active_appliances": len(active_appliances),
+        "active_appliances": ems.appliances.active_count,
         "total_appliances": len(ems.appliances),
         "estimated_daily_cost": round(current_consumption * 24 * 0.12, 2),
         "efficiency_score": ems.get_efficiency_score(current_consumption, historical_avg),
@@ -222,15 +505,18 @@ def dashboard():
 
     return jsonify(dashboard_data)
 
-@app.route('/api/appliances')
+@api.route('/appliances')
 def get_appliances():
     """Get all appliances with current status and consumption"""
     appliances_data = []
 
     for appliance in ems.appliances:
-        base_consumption = appliance['power_rating'] if appliance['status'] == 'on' else 0
-        current_consumption = base_consumption + random.uniform(-50, 50) if base_consumption > 0 else 0
-        current_consumption = max(0, current_consumption)
+        # Use the latest metered reading when there is a fresh one, otherwise simulate from the rating
+        current_consumption = ems.ingestor.live_power(appliance['id'])
+        if current_consumption is None:
+            base_consumption = appliance['power_rating'] if appliance['status'] == 'on' else 0
+            current_consumption = base_consumption + random.uniform(-50, 50) if base_consumption > 0 else 0
+            current_consumption = max(0, current_consumption)
 
         appliances_data.append({
             **appliance,
@@ -242,29 +528,59 @@ def get_appliances():
 
     return jsonify(appliances_data)
 
-@app.route('/api/historical')
+@api.route('/historical')
+@response_cache.cached(ttl=60)
 def get_historical_data():
-    """Get historical energy consumption data"""
+    """Get historical energy consumption data, optionally limited to ?start=&end= (ISO dates)"""
+    start, end = request.args.get('start'), request.args.get('end')
+    if start is None and end is None:
+        totals = ems.rollups.totals
+        return jsonify({
+            "data": ems.historical_data.to_records(),
+            "summary": {
+                "total_consumption": totals['consumption'].total,
+                "average_daily": totals['consumption'].mean,
+                "total_cost": totals['cost'].total,
+                "total_carbon": totals['carbon_footprint'].total
+            }
+        })
+
+    # Only the requested days are read; with a columnar store the rest stay on disk
+    try:
+        window = ems.historical_data.between(start, end)
+    except ValueError:
+        return jsonify({"error": "start and end must be ISO dates (YYYY-MM-DD)"}), 400
+    consumption = window.column('consumption')
     return jsonify({
-        "data": ems.historical_data,
+        "data": window.to_records(),
         "summary": {
-            "total_consumption": sum(d['consumption'] for d in ems.historical_data),
-            "average_daily": np.mean([d['consumption'] for d in ems.historical_data]),
-            "total_cost": sum(d['cost'] for d in ems.historical_data),
-            "total_carbon": sum(d['carbon_footprint'] for d in ems.historical_data)
+            "total_consumption": float(np.nansum(consumption)),
+            "average_daily": float(np.nanmean(consumption)) if len(window) else 0,
+            "total_cost": float(np.nansum(window.column('cost'))),
+            "total_carbon": float(np.nansum(window.column('carbon_footprint')))
         }
     })
 
-@app.route('/api/predictions')
+@api.route('/historical/rollups')
+def get_historical_rollups():
+    """Get consumption, cost and carbon aggregates per day, week or month"""
+    try:
+        summary = ems.rollups.period_summary(request.args.get('period', 'month'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"rollups": summary})
+
+@api.route('/predictions')
 def get_predictions():
     """Get AI-powered consumption predictions"""
+    forecast = inference_pool.run(ems.forecast, 30)
     predictions = {
-        "next_day": ems.predict_consumption(1),
-        "next_week": ems.predict_consumption(7),
-        "next_month": ems.predict_consumption(30),
+        "next_day": forecast['prediction'][0],
+        "next_week": forecast['prediction'][6],
+        "next_month": forecast['prediction'][29],
         "confidence_interval": {
-            "lower": ems.predict_consumption(1) * 0.85,
-            "upper": ems.predict_consumption(1) * 1.15
+            "lower": forecast['lower'][0],
+            "upper": forecast['upper'][0]
         },
         "trending": "stable",
         "factors": [
@@ -276,7 +592,22 @@ def get_predictions():
 
     return jsonify(predictions)
 
-@app.route('/api/recommendations')
+@api.route('/forecast')
+def get_forecast():
+    """Get the daily consumption forecast with per-tree prediction intervals"""
+    days = min(max(request.args.get('days', 30, type=int), 1), 365)
+    forecast = inference_pool.run(ems.forecast, days)
+    return jsonify({
+        "forecast": [
+            {"date": date, "prediction": prediction, "lower": lower, "upper": upper}
+            for date, prediction, lower, upper in zip(
+                forecast['date'], forecast['prediction'], forecast['lower'], forecast['upper']
+            )
+        ]
+    })
+
+@api.route('/recommendations')
+@response_cache.cached(ttl=60)
 def get_recommendations():
     """Get AI-generated energy saving recommendations"""
     recommendations = ems.generate_recommendations()
@@ -287,11 +618,21 @@ def get_recommendations():
         "estimated_cost_reduction": "$45-65/month"
     })
 
-@app.route('/api/gamification')
+@api.route('/schedule')
+def get_schedule():
+    """Get the load-shifting plan: cheapest start hour for each deferrable appliance"""
+    plan = ems.load_shift_plan()
+    return jsonify({
+        "plan": plan,
+        "total_savings": round(sum(item['savings'] for item in plan), 2)
+    })
+
+@api.route('/gamification')
+@response_cache.cached(ttl=60)
 def get_gamification_data():
     """Get gamification data including points, badges, challenges"""
-    recent_avg = np.mean([d['consumption'] for d in ems.historical_data[-7:]])
-    current_consumption = sum(a['power_rating'] for a in ems.appliances if a['status'] == 'on') / 1000
+    recent_avg = np.mean(ems.historical_data.column('consumption')[-7:])
+    current_consumption = ems.appliances.active_load / 1000
     efficiency_bonus = max(0, (recent_avg - current_consumption) * 10)
 
     gamification_data = {
@@ -340,33 +681,25 @@ def get_gamification_data():
 
     return jsonify(gamification_data)
 
-@app.route('/api/control/<int:appliance_id>', methods=['POST'])
+@api.route('/control/<int:appliance_id>', methods=['POST'])
 def control_appliance(appliance_id):
     """Control appliance (turn on/off)"""
     try:
         data = request.get_json()
         action = data.get('action')
 
-        appliance = next((a for a in ems.appliances if a['id'] == appliance_id), None)
+        appliance, old_status = ems.appliances.set_status(appliance_id, action)
         if not appliance:
             return jsonify({"error": "Appliance not found"}), 404
+        ems.bump_state_version()
 
-        old_status = appliance['status']
-        appliance['status'] = action
-
-        conn = sqlite3.connect('energy_management.db')
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO energy_logs (timestamp, appliance_id, power_consumption, status)
-            VALUES (?, ?, ?, ?)
-        """, (
+        # Queued for a group commit by the background writer; no disk wait here
+        ems.log_writer.write(
             datetime.datetime.now().isoformat(),
             appliance_id,
             appliance['power_rating'] if action == 'on' else 0,
             action
-        ))
-        conn.commit()
-        conn.close()
+        )
 
         return jsonify({
             "success": True,
@@ -378,83 +711,186 @@ def control_appliance(appliance_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/analytics')
+@api.route('/analytics')
+@response_cache.cached(ttl=60)
 def get_analytics():
     """Get detailed analytics and insights"""
-    total_consumption = sum(d['consumption'] for d in ems.historical_data)
-    avg_daily = np.mean([d['consumption'] for d in ems.historical_data])
+    totals = ems.rollups.totals
+    total_consumption = totals['consumption'].total
+    avg_daily = totals['consumption'].mean
 
-    consumption_by_type = {}
-    for appliance in ems.appliances:
-        appliance_type = appliance['type']
-        if appliance_type not in consumption_by_type:
-            consumption_by_type[appliance_type] = 0
-        if appliance['status'] == 'on':
-            consumption_by_type[appliance_type] += appliance['power_rating']
+    consumption_by_type = ems.appliances.load_by_type()
 
     analytics_data = {
         "consumption_summary": {
             "total_monthly": round(total_consumption, 2),
             "average_daily": round(avg_daily, 2),
-            "peak_day": max(ems.historical_data, key=lambda x: x['consumption'])['date'],
-            "lowest_day": min(ems.historical_data, key=lambda x: x['consumption'])['date']
+            "peak_day": totals['consumption'].max_key,
+            "lowest_day": totals['consumption'].min_key
         },
         "consumption_by_type": consumption_by_type,
         "cost_analysis": {
-            "total_cost": round(sum(d['cost'] for d in ems.historical_data), 2),
+            "total_cost": round(totals['cost'].total, 2),
             "average_daily_cost": round(avg_daily * 0.12, 2),
             "projected_monthly": round(avg_daily * 30 * 0.12, 2)
         },
         "environmental_impact": {
-            "total_carbon": round(sum(d['carbon_footprint'] for d in ems.historical_data), 2),
-            "daily_average_carbon": round(np.mean([d['carbon_footprint'] for d in ems.historical_data]), 2),
-            "trees_equivalent": round(sum(d['carbon_footprint'] for d in ems.historical_data) / 21.77, 1)
+            "total_carbon": round(totals['carbon_footprint'].total, 2),
+            "daily_average_carbon": round(totals['carbon_footprint'].mean, 2),
+            "trees_equivalent": round(totals['carbon_footprint'].total / 21.77, 1)
         }
     }
 
     return jsonify(analytics_data)
 
-@app.route('/api/alerts')
+@api.route('/alerts')
 def get_alerts():
     """Get system alerts and notifications"""
-    alerts = []
-
-    current_consumption = sum(a['power_rating'] for a in ems.appliances if a['status'] == 'on') / 1000
-    avg_consumption = np.mean([d['consumption'] for d in ems.historical_data[-7:]])
-
-    if current_consumption > avg_consumption * 1.3:
-        alerts.append({
-            "id": 1,
-            "type": "warning",
-            "title": "High Energy Consumption Detected",
-            "message": "Current consumption is 30% above normal. Consider turning off non-essential appliances.",
-            "timestamp": datetime.datetime.now().isoformat(),
-            "actionable": True
-        })
+    alerts = ems.get_alerts()
+    return jsonify({"alerts": alerts, "total_count": len(alerts)})
 
-    for appliance in ems.appliances:
-        if appliance['status'] == 'on' and appliance['type'] in ['Entertainment', 'Kitchen']:
-            if datetime.datetime.now().hour > 23 or datetime.datetime.now().hour < 6:
-                alerts.append({
-                    "id": len(alerts) + 1,
-                    "type": "info",
-                    "title": f"{appliance['name']} Still Running",
-                    "message": f"Consider turning off {appliance['name']} to save energy during off-hours.",
-                    "timestamp": datetime.datetime.now().isoformat(),
-                    "actionable": True,
-                    "appliance_id": appliance['id']
-                })
+def log_query_args():
+    return {
+        "start": request.args.get('start'),
+        "end": request.args.get('end')
+    }
 
-    alerts.append({
-        "id": len(alerts) + 1,
-        "type": "maintenance",
-        "title": "AC Filter Maintenance",
-        "message": "Smart AC filter may need cleaning. Clean filters improve efficiency by 15%.",
-        "timestamp": datetime.datetime.now().isoformat(),
-        "actionable": False
-    })
+def log_page_response(rows, next_cursor):
+    return jsonify({"logs": rows, "count": len(rows), "next_cursor": next_cursor})
 
-    return jsonify({"alerts": alerts, "total_count": len(alerts)})
+@api.route('/logs')
+def get_logs():
+    """Get control logs in a time range, one keyset-paginated page at a time"""
+    try:
+        limit = min(max(int(request.args.get('limit', 100)), 1), 1000)
+        rows, next_cursor = ems.log_query.logs(
+            **log_query_args(), limit=limit, cursor=request.args.get('cursor')
+        )
+    except ValueError:
+        return jsonify({"error": "Invalid 'limit' or 'cursor'"}), 400
+    return log_page_response(rows, next_cursor)
+
+@api.route('/logs/appliance/<int:appliance_id>')
+def get_appliance_logs(appliance_id):
+    """Get control logs for one appliance"""
+    try:
+        limit = min(max(int(request.args.get('limit', 100)), 1), 1000)
+        rows, next_cursor = ems.log_query.logs(
+            **log_query_args(), appliance_id=appliance_id, limit=limit, cursor=request.args.get('cursor')
+        )
+    except ValueError:
+        return jsonify({"error": "Invalid 'limit' or 'cursor'"}), 400
+    return log_page_response(rows, next_cursor)
+
+@api.route('/logs/aggregate')
+def get_log_aggregates():
+    """Get hourly or daily aggregates of control logs"""
+    try:
+        appliance_id = request.args.get('appliance_id', type=int)
+        buckets = ems.log_query.aggregate(
+            request.args.get('bucket', 'hour'), **log_query_args(), appliance_id=appliance_id
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"buckets": buckets})
+
+@api.route('/ingest', methods=['POST'])
+def ingest_readings():
+    """
+    Stream meter readings as NDJSON (chunked transfer is fine), one sample per line:
+    {"appliance_id": 1, "timestamp": "2025-09-27T19:00:00", "power_w": 3450.0}
+    """
+    accepted, rejected, backpressured = ems.ingestor.ingest_lines(request.stream, timeout=5)
+    status = 503 if backpressured else 200
+    return jsonify({"accepted": accepted, "rejected": rejected, "backpressure": backpressured}), status
+
+@api.route('/ingest/status')
+def ingest_status():
+    """Get ingestion throughput and queue depth"""
+    return jsonify(ems.ingestor.stats())
+
+@api.route('/stream')
+def stream_updates():
+    """Server-sent events: a snapshot, then consumption/appliance/alert deltas as state changes"""
+    subscription = ems.subscribe()
+    return Response(
+        stream_with_context(subscription.stream()),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@api.route('/models/retrain', methods=['POST'])
+def retrain_models():
+    """Schedule a background retrain; current models keep serving until the new ones are swapped in"""
+    ems.retrainer.request()
+    return jsonify({"scheduled": True, "status": ems.retrainer.status()}), 202
+
+@api.route('/models/status')
+def model_status():
+    """Get the state of background model retraining"""
+    return jsonify(ems.retrainer.status())
+
+@root.route('/api/sites')
+def list_sites():
+    """Get the sites currently loaded in memory"""
+    return jsonify({"sites": sites.active_sites(), **sites.stats()})
+
+@root.route('/ready')
+def ready():
+    """Readiness probe: 503 until the preloaded sites have loaded and trained their models"""
+    if not _warm.is_set():
+        return jsonify({"ready": False, "sites": sites.active_sites()}), 503
+    return jsonify({"ready": True, "sites": sites.active_sites()})
+
+_warm = threading.Event()
+
+def warm_up(site_ids=(DEFAULT_SITE,)):
+    """Load these sites and wait for their first training run, then report ready"""
+    for site_id in site_ids:
+        sites.get(site_id).retrainer.wait()
+    _warm.set()
+
+def create_app(preload=None):
+    """Build the Flask app
+
+    Sites (and their models) are loaded on first request. preload names
+    sites to load and train in a background thread right away; /ready
+    answers 503 until that has finished. Without preload the app is ready
+    immediately.
+    """
+    app = Flask(__name__)
+    CORS(app)
+    instrument_app(app, 'ems')
+    handle_pool_errors(app)
+    app.teardown_appcontext(release_site)
+    app.register_blueprint(root)
+    app.register_blueprint(api, url_prefix='/api')
+    # Every /api/... route is also served per site under /api/sites/<site_id>/...
+    app.register_blueprint(api, url_prefix='/api/sites/<site_id>', name='site')
+    if preload:
+        threading.Thread(target=warm_up, args=(tuple(preload),), name='ems-warmup', daemon=True).start()
+    else:
+        _warm.set()
+    return app
+
+def __getattr__(name):
+    # `future_predictions.app` (e.g. `flask --app future_predictions:app`) builds an app on first access
+    if name == 'app':
+        globals()['app'] = create_app()
+        return globals()['app']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+atexit.register(sites.close_all)
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    app = create_app(preload=[DEFAULT_SITE])
+    # Optional local ingestion sources for the default site: a TCP NDJSON socket and/or a tailed NDJSON file
+    default_site = sites.get(DEFAULT_SITE)
+    if os.environ.get('EMS_INGEST_SOCKET_PORT'):
+        default_site.ingestor.serve_socket(port=int(os.environ['EMS_INGEST_SOCKET_PORT']))
+    if os.environ.get('EMS_INGEST_TAIL'):
+        default_site.ingestor.tail_file(os.environ['EMS_INGEST_TAIL'])
+    if os.environ.get('EMS_DEBUG'):
+        app.run(debug=True, host='0.0.0.0', port=5000)
+    else:
+        serve(app, host='0.0.0.0', port=5000)
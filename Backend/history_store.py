@@ -0,0 +1,208 @@
+"""Compact storage for a site's appliances and daily history
+
+energy_data.json is read with a streaming parser, so only the appliances
+and historical_data arrays are ever materialized. Large histories can be
+converted once into a columnar store (one .npy file per column) that is
+opened memory-mapped: startup reads no rows at all, and a date range only
+touches the pages it covers.
+
+    python history_store.py energy_data.json energy_data_history
+"""
+import json
+import os
+import re
+import sys
+
+import numpy as np
+
+from timeseries import DailySeries
+
+WHITESPACE = re.compile(r'[ \t\r\n]*')
+
+
+class _JsonStream:
+    """Incremental reader over a JSON text, decoding one value at a time"""
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _read(self):
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character, or '' at end of input"""
+        while True:
+            self.pos = WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._read():
+                return ''
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} but found {found!r}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._read()
+
+
+def iter_json_items(path, keys, chunk_size=1 << 16):
+    """Yield (key, item) for each element of the top-level arrays named in keys
+
+    Other top-level values are decoded and dropped one at a time, so peak
+    memory is bounded by the largest single value rather than the file.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        stream = _JsonStream(f, chunk_size)
+        stream.expect('{')
+        if stream.peek() == '}':
+            return
+        while True:
+            key = stream.value()
+            stream.expect(':')
+            if key in keys and stream.peek() == '[':
+                stream.expect('[')
+                if stream.peek() == ']':
+                    stream.pos += 1
+                else:
+                    while True:
+                        yield key, stream.value()
+                        if stream.peek() != ',':
+                            break
+                        stream.pos += 1
+                    stream.expect(']')
+            else:
+                stream.value()
+            if stream.peek() != ',':
+                break
+            stream.pos += 1
+        stream.expect('}')
+
+
+def load_json(path, batch_size=4096):
+    """Stream appliances and historical_data out of an energy_data.json file"""
+    appliances = []
+    history = DailySeries()
+    batch = []
+    for key, item in iter_json_items(path, ('appliances', 'historical_data')):
+        if key == 'appliances':
+            appliances.append(item)
+            continue
+        batch.append(item)
+        if len(batch) >= batch_size:
+            history.extend(batch)
+            batch = []
+    history.extend(batch)
+    return appliances, history
+
+
+class HistoryStore:
+    """Columnar on-disk history: dates.npy plus one .npy per DailySeries column
+
+    Columns are opened memory-mapped and read-only. Series handed out by
+    read() are views over the mapping; the first append to one copies it
+    into memory, so the files are never modified in place.
+    """
+
+    META_FILE = 'meta.json'
+    APPLIANCES_FILE = 'appliances.json'
+
+    def __init__(self, directory, appliances, history):
+        self.directory = directory
+        self.appliances = appliances
+        self.history = history
+
+    @classmethod
+    def exists(cls, directory):
+        return os.path.exists(os.path.join(directory, cls.META_FILE))
+
+    @classmethod
+    def open(cls, directory):
+        with open(os.path.join(directory, cls.META_FILE), 'r') as f:
+            meta = json.load(f)
+        with open(os.path.join(directory, cls.APPLIANCES_FILE), 'r') as f:
+            appliances = json.load(f)
+
+        dates = np.load(os.path.join(directory, 'dates.npy'), mmap_mode='r')
+        columns = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+                   for name in meta['columns']}
+        for name, dtype in DailySeries.COLUMNS.items():
+            if name not in columns:
+                columns[name] = np.full(len(dates), np.nan, dtype=dtype)
+        return cls(directory, appliances, DailySeries.from_arrays(dates, columns))
+
+    @classmethod
+    def write(cls, directory, appliances, history):
+        """Write a store; each file is replaced atomically and the metadata goes last"""
+        os.makedirs(directory, exist_ok=True)
+        arrays = {'dates': history.dates}
+        arrays.update({name: history.column(name) for name in DailySeries.COLUMNS})
+        for name, values in arrays.items():
+            path = os.path.join(directory, f'{name}.npy')
+            tmp_path = os.path.join(directory, f'.{name}.tmp.npy')
+            np.save(tmp_path, np.ascontiguousarray(values))
+            os.replace(tmp_path, path)
+
+        for filename, payload in ((cls.APPLIANCES_FILE, appliances),
+                                  (cls.META_FILE, {"rows": len(history), "columns": list(DailySeries.COLUMNS)})):
+            tmp_path = os.path.join(directory, f'.{filename}.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump(payload, f, separators=(',', ':'))
+            os.replace(tmp_path, os.path.join(directory, filename))
+        return cls.open(directory)
+
+    def read(self, start=None, end=None):
+        """Days from start to end inclusive (ISO dates), as a view over the mapped columns"""
+        return self.history.between(start, end)
+
+
+def load_site_data(data_path, history_path=None):
+    """A site's (appliances, DailySeries), from the columnar store when there is one"""
+    if history_path and HistoryStore.exists(history_path):
+        store = HistoryStore.open(history_path)
+        return store.appliances, store.history
+    return load_json(data_path)
+
+
+def history_path_for(data_path):
+    """Where the columnar store for a JSON data file lives"""
+    return os.path.splitext(data_path)[0] + '_history'
+
+
+def main():
+    if len(sys.argv) not in (2, 3):
+        print("usage: python history_store.py energy_data.json [store_directory]")
+        sys.exit(1)
+    data_path = sys.argv[1]
+    directory = sys.argv[2] if len(sys.argv) == 3 else history_path_for(data_path)
+    appliances, history = load_json(data_path)
+    HistoryStore.write(directory, appliances, history)
+    print(f"Wrote {len(history)} days and {len(appliances)} appliances to {directory}")
+
+
+if __name__ == '__main__':
+    main()
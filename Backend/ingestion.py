@@ -0,0 +1,234 @@
+import datetime
+import json
+import logging
+import os
+import queue
+import socketserver
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ReadingIngestor:
+    """Streaming ingestion of per-appliance power samples
+
+    Samples are parsed on the caller's thread and handed to a single worker
+    in batches through a bounded queue; when the queue is full submit()
+    blocks (or times out), which pushes back on the producer. The worker
+    keeps the latest reading per appliance, integrates power into the
+    current day's kWh, queues energy_logs rows and, when a day closes,
+    appends it to the history and scores it with the anomaly detector.
+    """
+
+    def __init__(self, ems, batch_size=1000, max_batch_delay=0.5, max_pending_batches=256, max_gap_seconds=300):
+        self.ems = ems
+        self.batch_size = batch_size
+        self.max_batch_delay = max_batch_delay
+        self.max_gap_seconds = max_gap_seconds
+        self.observers = []
+        self.live = {}
+        self.current_day = None
+        self.current_day_kwh = 0.0
+        self.closed_days = []
+        self.accepted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.last_error = None
+        self._closed = False
+        self._queue = queue.Queue(maxsize=max_pending_batches)
+        self._thread = threading.Thread(target=self._run, name='reading-ingestor', daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def parse_sample(sample):
+        """Return (timestamp, appliance_id, power_w) from a sample dict
+
+        Timestamps are kept as naive local time, like datetime.now(); ones
+        with a UTC offset are converted to local time first.
+        """
+        if not isinstance(sample, dict):
+            raise TypeError("sample must be a JSON object")
+        timestamp = sample.get('timestamp')
+        timestamp = datetime.datetime.fromisoformat(timestamp) if timestamp else datetime.datetime.now()
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.astimezone().replace(tzinfo=None)
+        return timestamp, int(sample['appliance_id']), float(sample['power_w'])
+
+    def submit(self, samples, timeout=None):
+        """Queue a batch of parsed samples; returns False if the queue stayed full past the timeout"""
+        if self._closed:
+            raise RuntimeError("ReadingIngestor is closed")
+        try:
+            self._queue.put(samples, timeout=timeout)
+        except queue.Full:
+            return False
+        self.accepted += len(samples)
+        return True
+
+    def ingest_lines(self, lines, timeout=None):
+        """Parse NDJSON lines and queue them in batches
+
+        Returns (accepted, rejected, backpressured); on backpressure the
+        remaining lines are left unread.
+        """
+        accepted = rejected = 0
+        batch = []
+        batch_started = time.monotonic()
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                batch.append(self.parse_sample(json.loads(line)))
+            except (KeyError, TypeError, ValueError):
+                rejected += 1
+                continue
+            # Long-lived streams flush on size or age so slow producers are not held back
+            if len(batch) >= self.batch_size or time.monotonic() - batch_started >= self.max_batch_delay:
+                if not self.submit(batch, timeout):
+                    self.rejected += rejected + len(batch)
+                    return accepted, rejected + len(batch), True
+                accepted += len(batch)
+                batch = []
+                batch_started = time.monotonic()
+
+        if batch:
+            if not self.submit(batch, timeout):
+                self.rejected += rejected + len(batch)
+                return accepted, rejected + len(batch), True
+            accepted += len(batch)
+        self.rejected += rejected
+        return accepted, rejected, False
+
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                self._queue.task_done()
+                return
+            try:
+                self._process(batch)
+            except Exception as e:
+                self.failed += len(batch)
+                self.last_error = str(e)
+                logger.exception("Failed to process a batch of %d samples", len(batch))
+            finally:
+                self._queue.task_done()
+
+    def _process(self, batch):
+        log_rows = []
+        closed_days = []
+        for timestamp, appliance_id, power_w in batch:
+            day = timestamp.date()
+            if self.current_day is None:
+                self.current_day = day
+            elif day > self.current_day:
+                closed_days.append((self.current_day, self.current_day_kwh))
+                self.current_day = day
+                self.current_day_kwh = 0.0
+
+            previous = self.live.get(appliance_id)
+            if previous is not None:
+                gap = (timestamp - previous[0]).total_seconds()
+                if 0 < gap <= self.max_gap_seconds:
+                    self.current_day_kwh += previous[1] * gap / 3600000
+
+            self.live[appliance_id] = (timestamp, power_w)
+            log_rows.append((timestamp.isoformat(), appliance_id, power_w, 'on' if power_w > 0 else 'off'))
+
+        self.ems.log_writer.write_many(log_rows)
+        for observer in self.observers:
+            observer(batch)
+        self.processed += len(batch)
+        # Days are closed once the batch's readings are stored, so a failure here can't lose them
+        for day, kwh in closed_days:
+            try:
+                self._close_day(day, kwh)
+            except Exception as e:
+                self.last_error = str(e)
+                logger.exception("Failed to close day %s", day)
+        # Live readings and online alerts aren't part of any cached response (closing a day bumps
+        # the state version through add_historical_record), so only stream subscribers need telling
+        self.ems.publisher.request()
+
+    def _close_day(self, day, kwh):
+        consumption = round(kwh, 2)
+        record = {
+            "date": day.isoformat(),
+            "consumption": consumption,
+            "cost": round(consumption * 0.12, 2),
+            "carbon_footprint": self.ems.calculate_carbon_footprint(consumption)
+        }
+        self.ems.add_historical_record(record)
+        self.closed_days.append({**record, "anomaly": self.ems.detect_anomalies(consumption)})
+        del self.closed_days[:-30]
+        self.ems.retrainer.request()
+
+    def live_power(self, appliance_id, max_age=60):
+        """Latest power reading in watts, or None if there is no fresh one"""
+        reading = self.live.get(appliance_id)
+        if reading is None:
+            return None
+        if (datetime.datetime.now() - reading[0]).total_seconds() > max_age:
+            return None
+        return reading[1]
+
+    def flush(self):
+        """Block until every queued batch has been processed"""
+        self._queue.join()
+
+    def close(self):
+        """Process what is queued, then stop the worker"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def stats(self):
+        return {
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed,
+            "last_error": self.last_error,
+            "pending_batches": self._queue.qsize(),
+            "appliances_reporting": len(self.live),
+            "current_day": self.current_day.isoformat() if self.current_day else None,
+            "current_day_kwh": round(self.current_day_kwh, 3)
+        }
+
+    def serve_socket(self, host='127.0.0.1', port=5050):
+        """Accept NDJSON samples over plain TCP connections in a background thread"""
+        ingestor = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                ingestor.ingest_lines(self.rfile)
+
+        server = socketserver.ThreadingTCPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='ingest-socket', daemon=True).start()
+        return server
+
+    def tail_file(self, path, poll_interval=0.5, from_start=False):
+        """Follow an NDJSON file (like tail -f) in a background thread"""
+        def follow():
+            with open(path, 'r') as f:
+                if not from_start:
+                    f.seek(0, os.SEEK_END)
+                partial = ''
+                while True:
+                    lines = f.readlines()
+                    if not lines:
+                        time.sleep(poll_interval)
+                        continue
+                    lines[0] = partial + lines[0]
+                    # Keep a half-written last line until the writer finishes it
+                    partial = lines.pop() if not lines[-1].endswith('\n') else ''
+                    self.ingest_lines(lines)
+
+        thread = threading.Thread(target=follow, name='ingest-tail', daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,199 @@
+import numpy as np
+
+# Time-of-use tariff ($/kWh by hour of day) used when a site has no price feed of its own
+OFF_PEAK_PRICE = 0.08
+SHOULDER_PRICE = 0.12
+PEAK_PRICE = 0.20
+PEAK_HOURS = (14, 22)
+OFF_PEAK_HOURS = (22, 6)
+
+# Deferrable appliances by name: run length (h) and the allowed window as
+# hours from midnight, where values past 24 fall on the next day. An
+# appliance can override these with its own "schedule" field.
+DEFERRABLE = {
+    'Washing Machine': {"duration": 2, "earliest": 8, "latest": 32},
+    'Dishwasher': {"duration": 2, "earliest": 19, "latest": 31},
+    'Water Heater': {"duration": 2, "earliest": 0, "latest": 24},
+}
+
+
+def time_of_use_prices(horizon=48):
+    """Hourly tariff for `horizon` hours from midnight"""
+    hours = np.arange(horizon) % 24
+    prices = np.full(horizon, SHOULDER_PRICE)
+    prices[(hours >= PEAK_HOURS[0]) & (hours < PEAK_HOURS[1])] = PEAK_PRICE
+    prices[(hours >= OFF_PEAK_HOURS[0]) | (hours < OFF_PEAK_HOURS[1])] = OFF_PEAK_PRICE
+    return prices
+
+
+def is_peak_hour(hours):
+    hours = np.asarray(hours) % 24
+    return (hours >= PEAK_HOURS[0]) & (hours < PEAK_HOURS[1])
+
+
+def deferrable_jobs(appliances):
+    """(appliance, schedule) for each appliance that can be shifted"""
+    jobs = []
+    for appliance in appliances:
+        schedule = appliance.get('schedule')
+        if schedule is None:
+            schedule = next((s for name, s in DEFERRABLE.items() if appliance['name'].startswith(name)), None)
+        if schedule is not None:
+            jobs.append((appliance, schedule))
+    return jobs
+
+
+class ShiftPlan:
+    """Start hour and cost per job, in the order the jobs were given"""
+
+    def __init__(self, start, cost, baseline_start, baseline_cost, feasible):
+        self.start = start
+        self.cost = cost
+        self.baseline_start = baseline_start
+        self.baseline_cost = baseline_cost
+        self.feasible = feasible
+
+    @property
+    def savings(self):
+        return self.baseline_cost - self.cost
+
+    def __len__(self):
+        return len(self.start)
+
+
+def _window_costs(cumulative, site, power_kw, duration, horizon):
+    """Cost of starting each job at every hour, as a (jobs, horizon) matrix"""
+    starts = np.arange(horizon)
+    ends = np.minimum(starts[None, :] + duration[:, None], horizon)
+    rows = site[:, None]
+    return (cumulative[rows, ends] - cumulative[rows, starts[None, :]]) * power_kw[:, None]
+
+
+def plan_starts(prices, site, power_kw, duration, earliest, latest, baseline_start=None,
+                max_load_kw=None, base_load_kw=None):
+    """Cheapest start hour for every deferrable job across every site at once
+
+    prices is (horizon,) or (sites, horizon) in $/kWh; peak penalties can be
+    folded into it. Jobs are given as parallel arrays: the site row each
+    belongs to, power (kW), run length (h) and the window [earliest, latest)
+    it must run within. Without a load limit each job independently takes
+    its cheapest window, via a cumulative-sum lookup over all start hours.
+    With max_load_kw (per site), jobs are placed largest first, one job per
+    site per pass, skipping windows that would push the site's load over the
+    limit, so the plan doesn't create a new peak in the cheap hours.
+    """
+    prices = np.atleast_2d(np.asarray(prices, dtype=float))
+    n_sites, horizon = prices.shape
+    site = np.asarray(site, dtype=int)
+    power_kw = np.asarray(power_kw, dtype=float)
+    duration = np.asarray(duration, dtype=int)
+    earliest = np.clip(np.asarray(earliest, dtype=int), 0, horizon)
+    latest = np.clip(np.asarray(latest, dtype=int), 0, horizon)
+    baseline_start = earliest if baseline_start is None else np.asarray(baseline_start, dtype=int)
+
+    cumulative = np.zeros((n_sites, horizon + 1))
+    np.cumsum(prices, axis=1, out=cumulative[:, 1:])
+    costs = _window_costs(cumulative, site, power_kw, duration, horizon)
+
+    starts = np.arange(horizon)
+    ends = starts[None, :] + duration[:, None]
+    allowed = (starts[None, :] >= earliest[:, None]) & (ends <= latest[:, None])
+    feasible = allowed.any(axis=1)
+
+    if max_load_kw is None:
+        chosen = np.where(allowed, costs, np.inf).argmin(axis=1)
+    else:
+        chosen = _place_with_limit(costs, allowed, site, power_kw, duration, n_sites, horizon,
+                                   np.broadcast_to(np.asarray(max_load_kw, dtype=float), (n_sites,)),
+                                   base_load_kw)
+
+    # Jobs whose window can't hold them keep their baseline start
+    chosen = np.where(feasible, chosen, np.clip(baseline_start, 0, horizon - 1))
+    jobs = np.arange(len(site))
+    baseline_cost = costs[jobs, np.clip(baseline_start, 0, horizon - 1)]
+    return ShiftPlan(chosen, costs[jobs, chosen], baseline_start, baseline_cost, feasible)
+
+
+def _place_with_limit(costs, allowed, site, power_kw, duration, n_sites, horizon, max_load_kw, base_load_kw):
+    load = np.zeros((n_sites, horizon)) if base_load_kw is None else np.array(base_load_kw, dtype=float)
+    load = np.broadcast_to(load, (n_sites, horizon)).copy()
+    hours = np.arange(horizon)
+    chosen = np.zeros(len(site), dtype=int)
+
+    # Rank jobs within their site by power, so pass r places every site's r-th largest job together
+    order = np.lexsort((-power_kw, site))
+    sorted_sites = site[order]
+    group_start = np.searchsorted(sorted_sites, sorted_sites, side='left')
+    rank = np.empty(len(site), dtype=int)
+    rank[order] = np.arange(len(site)) - group_start
+
+    for r in range(rank.max() + 1 if len(rank) else 0):
+        jobs = np.flatnonzero(rank == r)
+        rows = site[jobs]
+        # Hours in which this job would push its site over the limit, counted per window by cumsum
+        over = load[rows] + power_kw[jobs, None] > max_load_kw[rows, None]
+        over_count = np.zeros((len(jobs), horizon + 1), dtype=int)
+        np.cumsum(over, axis=1, out=over_count[:, 1:])
+        ends = np.minimum(hours[None, :] + duration[jobs, None], horizon)
+        fits = over_count[np.arange(len(jobs))[:, None], ends] == over_count[:, :horizon]
+
+        job_allowed = allowed[jobs]
+        within_limit = job_allowed & fits
+        candidates = np.where(within_limit.any(axis=1)[:, None], within_limit, job_allowed)
+        picks = np.where(candidates, costs[jobs], np.inf).argmin(axis=1)
+        chosen[jobs] = picks
+
+        running = (hours[None, :] >= picks[:, None]) & (hours[None, :] < picks[:, None] + duration[jobs, None])
+        load[rows] += running * power_kw[jobs, None]
+    return chosen
+
+
+def plan_sites(sites_appliances, prices=None, current_hour=0, max_load_kw=None):
+    """Plan every site's deferrable appliances in one vectorized pass
+
+    sites_appliances is a list of appliance lists (one per site). Returns a
+    list of plans per site: dicts with the appliance, its start hour (hours
+    from midnight) and the cost against starting as early as allowed.
+    """
+    prices = time_of_use_prices() if prices is None else np.asarray(prices, dtype=float)
+    jobs, site, power_kw, duration, earliest, latest = [], [], [], [], [], []
+    for s, appliances in enumerate(sites_appliances):
+        for appliance, schedule in deferrable_jobs(appliances):
+            jobs.append((s, appliance))
+            site.append(s if prices.ndim == 2 else 0)
+            power_kw.append(appliance['power_rating'] / 1000)
+            duration.append(schedule['duration'])
+            earliest.append(max(schedule['earliest'], current_hour))
+            latest.append(schedule['latest'])
+
+    plans = [[] for _ in sites_appliances]
+    if not jobs:
+        return plans
+    if max_load_kw is not None and prices.ndim == 1:
+        # One price row shared by every site, but each site's load is tracked separately
+        prices = np.broadcast_to(prices, (len(sites_appliances), len(prices)))
+        site = [s for s, _ in jobs]
+    plan = plan_starts(prices, site, power_kw, duration, earliest, latest, max_load_kw=max_load_kw)
+
+    for i, (s, appliance) in enumerate(jobs):
+        plans[s].append({
+            "appliance_id": appliance['id'],
+            "appliance": appliance['name'],
+            "start_hour": int(plan.start[i]),
+            "duration_hours": int(duration[i]),
+            "cost": round(float(plan.cost[i]), 2),
+            "baseline_start_hour": int(plan.baseline_start[i]),
+            "baseline_cost": round(float(plan.baseline_cost[i]), 2),
+            "savings": round(float(plan.savings[i]), 2),
+            "feasible": bool(plan.feasible[i])
+        })
+    return plans
+
+
+def cheapest_hours(hours, window=24, prices=None):
+    """For each hour of day, the cheapest hour of day within the next `window` hours"""
+    prices = time_of_use_prices() if prices is None else np.asarray(prices, dtype=float)
+    hours = np.asarray(hours, dtype=int) % 24
+    plan = plan_starts(prices, np.zeros(len(hours), dtype=int), np.ones(len(hours)),
+                       np.ones(len(hours), dtype=int), hours, hours + window)
+    return plan.start % 24
@@ -0,0 +1,405 @@
+"""Open-loop load generator for the EMS and energy analysis services
+
+Requests are scheduled at a fixed target rate, whatever the server does, and
+latency is measured from each request's scheduled start. A server that falls
+behind therefore shows up as growing latency rather than as a quietly lower
+request rate. Alongside the request mix, --streams long-lived /api/stream
+clients stay connected for the whole run, the way open dashboard tabs do, so
+a server that ties up request threads with streams shows up too.
+
+    python future_predictions.py &
+    python loadtest.py --rate 100 --duration 30 --streams 50 --analysis-url http://localhost:5001
+"""
+import argparse
+import datetime
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+
+class Route:
+    """One weighted route; build(state) returns (method, path, request kwargs)
+
+    bench=False leaves the route out of benchmarks.py, for routes that don't
+    finish (streams) or that start background work (retraining).
+    """
+
+    def __init__(self, name, weight, build, bench=True):
+        self.name = name
+        self.weight = weight
+        self.build = build
+        self.bench = bench
+
+
+def _get(path):
+    return lambda state: ('GET', state.scoped(path), {})
+
+
+def _control(state):
+    appliance_id = random.choice(state.appliance_ids)
+    body = {"action": random.choice(['on', 'off'])}
+    return 'POST', state.scoped(f"/api/control/{appliance_id}"), {"json": body}
+
+
+def _ingest(state):
+    now = datetime.datetime.now().isoformat()
+    lines = [
+        json.dumps({"timestamp": now, "appliance_id": random.choice(state.appliance_ids),
+                    "power_w": round(random.uniform(0, 4000), 1)})
+        for _ in range(50)
+    ]
+    return 'POST', state.scoped('/api/ingest'), {
+        "data": '\n'.join(lines), "headers": {"Content-Type": "application/x-ndjson"}
+    }
+
+
+def _stream(state):
+    # Only the time to the response headers is measured; _fire closes the connection after that
+    return 'GET', state.scoped('/api/stream'), {"stream": True, "headers": {"Accept": "text/event-stream"}}
+
+
+def _chart(state):
+    return 'GET', state.chart_path or '/energy_analysis/chart/unknown.png', {}
+
+
+def _analysis_point():
+    timestamp = datetime.datetime(2025, 9, 1) + datetime.timedelta(hours=random.randint(0, 24 * 60))
+    return {"timestamp": timestamp.isoformat(), "temperature_c": round(random.uniform(10, 35), 1)}
+
+
+def _analyze(state):
+    return 'POST', '/energy_analysis', {"json": _analysis_point()}
+
+
+def _analyze_batch(state):
+    return 'POST', '/energy_analysis/batch', {"json": [_analysis_point() for _ in range(100)]}
+
+
+def _readings(state):
+    point = _analysis_point()
+    point["energy_kwh"] = round(random.uniform(0.5, 2.5), 3)
+    return 'POST', '/energy_analysis/readings', {"json": [point]}
+
+
+EMS_ROUTES = [
+    Route('GET /', 1, _get('/')),
+    Route('GET /api/dashboard', 10, _get('/api/dashboard')),
+    Route('GET /api/appliances', 5, _get('/api/appliances')),
+    Route('GET /api/historical', 3, _get('/api/historical')),
+    Route('GET /api/historical/rollups', 2, _get('/api/historical/rollups?period=month')),
+    Route('GET /api/predictions', 3, _get('/api/predictions')),
+    Route('GET /api/forecast', 2, _get('/api/forecast?days=7')),
+    Route('GET /api/recommendations', 3, _get('/api/recommendations')),
+    Route('GET /api/schedule', 1, _get('/api/schedule')),
+    Route('GET /api/gamification', 2, _get('/api/gamification')),
+    Route('GET /api/analytics', 3, _get('/api/analytics')),
+    Route('GET /api/alerts', 3, _get('/api/alerts')),
+    Route('GET /api/logs', 2, _get('/api/logs?limit=100')),
+    Route('GET /api/logs/appliance/<id>', 1, lambda state: ('GET', state.scoped(f"/api/logs/appliance/{random.choice(state.appliance_ids)}?limit=100"), {})),
+    Route('GET /api/logs/aggregate', 1, _get('/api/logs/aggregate?bucket=hour')),
+    Route('GET /api/ingest/status', 1, _get('/api/ingest/status')),
+    Route('GET /api/models/status', 1, _get('/api/models/status')),
+    Route('GET /api/sites', 1, _get('/api/sites')),
+    Route('GET /ready', 1, _get('/ready')),
+    Route('GET /metrics', 1, _get('/metrics')),
+    Route('GET /api/stream', 1, _stream, bench=False),
+    Route('POST /api/control/<id>', 3, _control),
+    Route('POST /api/ingest', 2, _ingest),
+    Route('POST /api/models/retrain', 0.1, lambda state: ('POST', state.scoped('/api/models/retrain'), {}), bench=False),
+]
+
+ANALYSIS_ROUTES = [
+    Route('POST /energy_analysis', 5, _analyze),
+    Route('POST /energy_analysis/batch', 2, _analyze_batch),
+    Route('POST /energy_analysis/readings', 1, _readings),
+    Route('GET /energy_analysis/chart/<hash>.png', 3, _chart),
+    Route('GET /ready', 1, _get('/ready')),
+    Route('GET /metrics', 1, _get('/metrics')),
+]
+
+
+class LoadState:
+    """What the request builders need to know about the target"""
+
+    def __init__(self, sites=(), appliance_ids=(1, 2, 3, 4, 5), chart_path=None):
+        self.sites = list(sites)
+        self.appliance_ids = list(appliance_ids)
+        self.chart_path = chart_path
+
+    def scoped(self, path):
+        """Move an /api/ path under a random site's /api/sites/<site_id>/ prefix"""
+        if not self.sites or not path.startswith('/api/') or path.startswith('/api/sites'):
+            return path
+        return f"/api/sites/{random.choice(self.sites)}/{path[len('/api/'):]}"
+
+
+class StreamClients:
+    """Long-lived /api/stream connections held open for a whole run
+
+    Each client reconnects when its stream ends or fails, and counts what it
+    saw: statuses of its connection attempts, events and heartbeats received,
+    and the time from connecting to the first byte.
+    """
+
+    def __init__(self, base_url, count, state, timeout=30):
+        self.base_url = base_url
+        self.count = count
+        self.state = state
+        self.timeout = timeout
+        self.statuses = {}
+        self.events = 0
+        self.heartbeats = 0
+        self.first_byte = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.count):
+            thread = threading.Thread(target=self._client, name=f'sse-client-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _count(self, status):
+        with self._lock:
+            self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+
+    def _client(self):
+        session = requests.Session()
+        while not self._stop.is_set():
+            _, path, kwargs = _stream(self.state)
+            sent = time.perf_counter()
+            try:
+                response = session.get(self.base_url + path, timeout=self.timeout, **kwargs)
+            except requests.RequestException as e:
+                self._count(type(e).__name__)
+                self._stop.wait(1)
+                continue
+            self._count(response.status_code)
+            if response.status_code != 200:
+                response.close()
+                self._stop.wait(1)
+                continue
+            try:
+                # chunk_size=1 so each line is seen as it arrives rather than once a buffer fills
+                for i, line in enumerate(response.iter_lines(chunk_size=1)):
+                    if i == 0:
+                        with self._lock:
+                            self.first_byte.append(time.perf_counter() - sent)
+                    if line.startswith(b'event:'):
+                        with self._lock:
+                            self.events += 1
+                    elif line.startswith(b': heartbeat'):
+                        with self._lock:
+                            self.heartbeats += 1
+                    if self._stop.is_set():
+                        break
+            except requests.RequestException:
+                pass
+            finally:
+                response.close()
+
+    def stop(self, timeout=2):
+        # Clients notice at their next event or heartbeat; they are daemon threads, so stragglers
+        # don't hold up the exit (closing a response from another thread can deadlock)
+        self._stop.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0, deadline - time.monotonic()))
+
+    def report(self):
+        first_byte = np.array(self.first_byte) * 1000
+        return {
+            "clients": self.count,
+            "statuses": dict(self.statuses),
+            "events": self.events,
+            "heartbeats": self.heartbeats,
+            "first_byte_p50_ms": round(float(np.percentile(first_byte, 50)), 2) if len(first_byte) else None,
+            "first_byte_max_ms": round(float(first_byte.max()), 2) if len(first_byte) else None
+        }
+
+
+class LoadTest:
+    """Drive a weighted route mix at `rate` requests/second for `duration` seconds
+
+    streams: optional StreamClients kept connected for the whole run.
+    """
+
+    def __init__(self, targets, rate=50, duration=30, warmup=2, concurrency=64, timeout=30, state=None,
+                 streams=None):
+        # targets: [(base_url, [Route, ...]), ...]
+        self.plan = [(base_url, route) for base_url, routes in targets for route in routes]
+        self.weights = np.array([route.weight for _, route in self.plan], dtype=float)
+        self.weights /= self.weights.sum()
+        self.rate = rate
+        self.duration = duration
+        self.warmup = warmup
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.state = state or LoadState()
+        self.streams = streams
+        self.samples = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _fire(self, base_url, route, scheduled, record):
+        method, path, kwargs = route.build(self.state)
+        sent = time.perf_counter()
+        try:
+            response = self._session().request(method, base_url + path, timeout=self.timeout, **kwargs)
+            status = response.status_code
+            response.close()
+        except requests.RequestException as e:
+            status = type(e).__name__
+        finished = time.perf_counter()
+        if record:
+            with self._lock:
+                # Latency from the scheduled start includes time spent waiting for a free worker
+                self.samples.append((route.name, status, finished - scheduled, finished - sent))
+
+    def run(self):
+        total = int(self.rate * (self.warmup + self.duration))
+        warmup_requests = int(self.rate * self.warmup)
+        choices = np.random.choice(len(self.plan), size=total, p=self.weights)
+        late = 0
+
+        if self.streams is not None:
+            self.streams.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                started = time.perf_counter()
+                for i, choice in enumerate(choices):
+                    scheduled = started + i / self.rate
+                    delay = scheduled - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    elif delay < -0.01:
+                        late += 1
+                    if i == warmup_requests:
+                        measured_from = time.perf_counter()
+                    base_url, route = self.plan[choice]
+                    pool.submit(self._fire, base_url, route, scheduled, i >= warmup_requests)
+        finally:
+            if self.streams is not None:
+                self.streams.stop()
+        elapsed = time.perf_counter() - (measured_from if warmup_requests < total else started)
+        return self.report(elapsed, late)
+
+    def report(self, elapsed, late=0):
+        by_route = {}
+        for name, status, latency, service in self.samples:
+            by_route.setdefault(name, []).append((status, latency, service))
+
+        def summarize(rows):
+            latencies = np.array([r[1] for r in rows]) * 1000
+            service = np.array([r[2] for r in rows]) * 1000
+            statuses = {}
+            for status, _, _ in rows:
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+            errors = sum(count for status, count in statuses.items() if not status.startswith(('2', '3')))
+            return {
+                "requests": len(rows),
+                "errors": errors,
+                "statuses": statuses,
+                "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+                "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+                "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+                "max_ms": round(float(latencies.max()), 2),
+                "service_p50_ms": round(float(np.percentile(service, 50)), 2)
+            }
+
+        overall = summarize([row for rows in by_route.values() for row in rows]) if self.samples else {}
+        overall.update({
+            "target_rate": self.rate,
+            "throughput_rps": round(len(self.samples) / elapsed, 2) if elapsed else 0,
+            "seconds": round(elapsed, 2),
+            "late_dispatches": late
+        })
+        report = {"overall": overall, "routes": {name: summarize(rows) for name, rows in sorted(by_route.items())}}
+        if self.streams is not None:
+            report["streams"] = self.streams.report()
+        return report
+
+
+def discover_appliance_ids(base_url, site=None):
+    prefix = f"/api/sites/{site}" if site else ''
+    try:
+        appliances = requests.get(f"{base_url}{prefix}/api/appliances", timeout=10).json()
+        return [a['id'] for a in appliances] or [1]
+    except (requests.RequestException, ValueError, KeyError, TypeError):
+        return [1, 2, 3, 4, 5]
+
+
+def discover_chart_path(base_url):
+    try:
+        response = requests.post(f"{base_url}/energy_analysis",
+                                 json={"timestamp": "2025-09-27T19:00:00", "temperature_c": 23.5}, timeout=60)
+        return response.json()['consumption_chart_url']
+    except (requests.RequestException, ValueError, KeyError, TypeError):
+        return None
+
+
+def print_report(report):
+    overall = report['overall']
+    print(f"{'route':<40}{'reqs':>7}{'errs':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, stats in report['routes'].items():
+        print(f"{name:<40}{stats['requests']:>7}{stats['errors']:>6}"
+              f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+    print(f"{'ALL':<40}{overall.get('requests', 0):>7}{overall.get('errors', 0):>6}"
+          f"{overall.get('p50_ms', '-'):>10}{overall.get('p95_ms', '-'):>10}{overall.get('p99_ms', '-'):>10}")
+    print(f"\nthroughput {overall['throughput_rps']} req/s (target {overall['target_rate']}), "
+          f"late dispatches {overall['late_dispatches']}")
+    streams = report.get('streams')
+    if streams:
+        print(f"streams: {streams['clients']} clients, connects {streams['statuses']}, "
+              f"{streams['events']} events, {streams['heartbeats']} heartbeats, "
+              f"first byte p50 {streams['first_byte_p50_ms']} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Flask services at a fixed request rate")
+    parser.add_argument('--ems-url', default='http://localhost:5000', help="empty string to skip")
+    parser.add_argument('--analysis-url', default='', help="energy_analysis app base URL (skipped if empty)")
+    parser.add_argument('--rate', type=float, default=50, help="requests per second across all routes")
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--warmup', type=float, default=2)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--streams', type=int, default=50, help="long-lived /api/stream clients held open (EMS only)")
+    parser.add_argument('--sites', default='', help="comma-separated site ids to spread EMS traffic over")
+    parser.add_argument('--report', default=None, help="write the JSON report here")
+    args = parser.parse_args()
+
+    sites = [s for s in args.sites.split(',') if s]
+    targets = []
+    if args.ems_url:
+        targets.append((args.ems_url, EMS_ROUTES))
+    if args.analysis_url:
+        targets.append((args.analysis_url, ANALYSIS_ROUTES))
+    if not targets:
+        parser.error("nothing to test: give --ems-url and/or --analysis-url")
+
+    appliance_ids = discover_appliance_ids(args.ems_url, sites[0] if sites else None) if args.ems_url else [1]
+    chart_path = discover_chart_path(args.analysis_url) if args.analysis_url else None
+    state = LoadState(sites, appliance_ids, chart_path)
+    streams = StreamClients(args.ems_url, args.streams, state) if args.ems_url and args.streams else None
+    test = LoadTest(targets, args.rate, args.duration, args.warmup, args.concurrency, state=state, streams=streams)
+    report = test.run()
+    print_report(report)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+import bisect
+import cProfile
+import datetime
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, request
+from flask.json.provider import DefaultJSONProvider
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+TRAIN_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if value == value else 'NaN'
+
+
+class Histogram:
+    """Prometheus-style histogram with one series per label combination"""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket (non-cumulative) counts plus +Inf, then sum
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            series = [(key, list(counts), total) for key, (counts, total) in self._series.items()]
+        for key, counts, total in sorted(series):
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield f"{self.name}_bucket{_format_labels(labels + [('le', le)])} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(labels)} {cumulative}"
+
+
+class CallbackMetric:
+    """Gauge or counter read from a callback at scrape time
+
+    The callback returns a number, or a list of (labels dict, value) pairs.
+    """
+
+    def __init__(self, name, documentation, callback, type='gauge'):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.type = type
+
+    def samples(self):
+        values = self.callback()
+        if not isinstance(values, list):
+            values = [({}, values)]
+        for labels, value in values:
+            yield f"{self.name}{_format_labels(sorted(labels.items()))} {_format_value(value)}"
+
+
+class MetricsRegistry:
+    """The metrics one process exposes on /metrics"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._caches = {}
+        self._lock = threading.Lock()
+        self.register(CallbackMetric('cache_requests_total', "Cache lookups by cache and result",
+                                     self._cache_requests, type='counter'))
+        self.register(CallbackMetric('cache_hit_ratio', "Fraction of cache lookups that hit",
+                                     lambda: self._cache_values('hit_rate')))
+        self.register(CallbackMetric('cache_entries', "Entries currently cached",
+                                     lambda: self._cache_values('entries')))
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def register_cache(self, name, stats_fn):
+        """Report a cache whose stats() has hits, misses, entries and hit_rate"""
+        with self._lock:
+            self._caches[name] = stats_fn
+
+    def _cache_stats(self):
+        with self._lock:
+            caches = list(self._caches.items())
+        return [(name, stats_fn()) for name, stats_fn in caches]
+
+    def _cache_requests(self):
+        return [({"cache": name, "result": result}, stats[field])
+                for name, stats in self._cache_stats()
+                for result, field in (('hit', 'hits'), ('miss', 'misses'))]
+
+    def _cache_values(self, field):
+        return [({"cache": name}, stats[field]) for name, stats in self._cache_stats()]
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_LATENCY = REGISTRY.register(Histogram(
+    'http_request_duration_seconds', "Request latency by app, route, method and status",
+    ('app', 'route', 'method', 'status')))
+SECTION_LATENCY = REGISTRY.register(Histogram(
+    'section_duration_seconds', "Time spent in hot sections (predict, anomaly_score, chart_render, sqlite_write, json_serialize)",
+    ('section',)))
+TRAIN_DURATION = REGISTRY.register(Histogram(
+    'model_train_duration_seconds', "Model training (or registry load) duration", ('model',), buckets=TRAIN_BUCKETS))
+
+
+def timed(section):
+    """Time a block into section_duration_seconds{section=...}"""
+    return SECTION_LATENCY.time(section=section)
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that records serialization time"""
+
+    def dumps(self, obj, **kwargs):
+        with timed('json_serialize'):
+            return super().dumps(obj, **kwargs)
+
+
+def instrument_app(app, app_name, registry=REGISTRY, profile_slow_ms=None, profile_dir='profiles'):
+    """Record per-route latency for every request and serve the registry on /metrics
+
+    With profile_slow_ms set (or the EMS_PROFILE_SLOW_MS environment
+    variable), each request runs under cProfile and requests slower than the
+    threshold have their stats dumped to profile_dir as .prof files (open
+    with `python -m pstats` or snakeviz). Profiling slows every request, so
+    it is meant for local investigation only.
+    """
+    if profile_slow_ms is None and os.environ.get('EMS_PROFILE_SLOW_MS'):
+        profile_slow_ms = float(os.environ['EMS_PROFILE_SLOW_MS'])
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def start_request_timer():
+        g._request_started = time.perf_counter()
+        if profile_slow_ms is not None:
+            g._profiler = cProfile.Profile()
+            g._profiler.enable()
+
+    @app.after_request
+    def record_request_latency(response):
+        started = g.pop('_request_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        REQUEST_LATENCY.observe(elapsed, app=app_name, route=route, method=request.method,
+                                status=response.status_code)
+
+        profiler = g.pop('_profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            if elapsed * 1000 >= profile_slow_ms:
+                os.makedirs(profile_dir, exist_ok=True)
+                stamp = datetime.datetime.now().strftime('%Y%m%dT%H%M%S%f')
+                slug = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+                profiler.dump_stats(os.path.join(profile_dir, f"{stamp}-{request.method}-{slug}-{elapsed * 1000:.0f}ms.prof"))
+        return response
+
+    @app.teardown_request
+    def stop_profiler(exc):
+        profiler = g.pop('_profiler', None)
+        if profiler is not None:
+            profiler.disable()
+
+    def metrics():
+        """Prometheus text exposition of this process's metrics"""
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
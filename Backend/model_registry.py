@@ -0,0 +1,88 @@
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+
+class ModelRegistry:
+    """Fitted models persisted on disk, keyed by a hash of their training data
+
+    A model is only refit when its training data or parameters change;
+    otherwise the saved artifact is loaded (memory-mapped) from disk.
+    """
+
+    def __init__(self, directory='models', mmap_mode='r'):
+        self.directory = directory
+        self.mmap_mode = mmap_mode
+        self.versions = {}
+
+    @staticmethod
+    def fingerprint(estimator, X, y=None):
+        """Content hash of the training data, estimator parameters and sklearn version"""
+        # Only imported when a model is actually fit or loaded, keeping app startup fast
+        import pandas as pd
+        import sklearn
+
+        digest = hashlib.sha256()
+        digest.update(type(estimator).__name__.encode())
+        # n_jobs/verbose change how a model is fit, not what it learns
+        params = {k: v for k, v in estimator.get_params().items() if k not in ('n_jobs', 'verbose')}
+        digest.update(repr(sorted(params.items())).encode())
+        digest.update(sklearn.__version__.encode())
+        for part in (X, y):
+            if part is None:
+                continue
+            if isinstance(part, (pd.DataFrame, pd.Series)):
+                labels = part.columns if isinstance(part, pd.DataFrame) else [part.name]
+                digest.update(repr(list(labels)).encode())
+                part = pd.util.hash_pandas_object(part, index=False).values
+            digest.update(np.ascontiguousarray(part).tobytes())
+        return digest.hexdigest()[:16]
+
+    def path_for(self, name, version):
+        return os.path.join(self.directory, f"{name}-{version}.joblib")
+
+    def load_or_fit(self, name, estimator, X, y=None):
+        """Return the saved model for this training data, fitting and saving it on a miss"""
+        version = self.fingerprint(estimator, X, y)
+        path = self.path_for(name, version)
+
+        model = None
+        if os.path.exists(path):
+            import joblib
+            try:
+                model = joblib.load(path, mmap_mode=self.mmap_mode)
+            except Exception:
+                model = None
+
+        if model is None:
+            model = estimator.fit(X) if y is None else estimator.fit(X, y)
+            self.save(name, version, model)
+
+        self.versions[name] = version
+        return model
+
+    def save(self, name, version, model):
+        """Write the artifact atomically and drop older versions of the same model"""
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        os.close(fd)
+        try:
+            import joblib
+            joblib.dump(model, tmp_path)
+            os.replace(tmp_path, self.path_for(name, version))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        current = os.path.basename(self.path_for(name, version))
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.joblib') or filename == current:
+                continue
+            if filename[:-len('.joblib')].rsplit('-', 1)[0] == name:
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except OSError:
+                    pass
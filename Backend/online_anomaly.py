@@ -0,0 +1,149 @@
+import collections
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Standard deviation / mean absolute deviation for a normal distribution
+MEAN_ABS_DEV_TO_STD = np.sqrt(np.pi / 2)
+
+
+class OnlineAnomalyDetector:
+    """Streaming anomaly scoring per appliance and hour of day
+
+    Each (appliance, hour) slot keeps an exponentially weighted mean and
+    mean absolute deviation, so scoring and updating a sample is O(1) and
+    memory is 24 slots per appliance. A sample is anomalous when its z-score
+    against the slot's mean exceeds `threshold` once the slot has seen
+    `warmup` samples. The scale is the mean absolute deviation times
+    sqrt(pi/2), which estimates the standard deviation for normally
+    distributed draw; outliers are clipped before they are folded in, so one
+    spike doesn't drag the mean or scale. The scale is floored at
+    `min_scale` watts and `min_scale_fraction` of the slot mean, so
+    appliances with a constant draw (deviation near 0) aren't flagged for a
+    1 W wobble.
+
+    Optionally an IsolationForest is refreshed in the background every
+    `refresh_every` samples on a bounded reservoir of recent
+    (hour, power, z) features and used as a second opinion per batch.
+    """
+
+    def __init__(self, alpha=0.05, threshold=4.0, warmup=30, refresh_every=None,
+                 reservoir_size=4096, max_events=500, min_scale=5.0, min_scale_fraction=0.02):
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup = warmup
+        self.min_scale = min_scale
+        self.min_scale_fraction = min_scale_fraction
+        self.refresh_every = refresh_every
+        self.slots = {}
+        self.mean = np.zeros((0, 24))
+        self.mad = np.zeros((0, 24))
+        self.count = np.zeros((0, 24), dtype=np.int64)
+        self.events = collections.deque(maxlen=max_events)
+        self.samples_seen = 0
+        self.forest = None
+        self._reservoir = collections.deque(maxlen=reservoir_size)
+        self._since_refresh = 0
+        self._refreshing = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='anomaly-refresh') if refresh_every else None
+
+    def _slot(self, appliance_id):
+        slot = self.slots.get(appliance_id)
+        if slot is None:
+            slot = len(self.slots)
+            if slot >= len(self.mean):
+                grow = max(64, len(self.mean))
+                self.mean = np.vstack([self.mean, np.zeros((grow, 24))])
+                self.mad = np.vstack([self.mad, np.zeros((grow, 24))])
+                self.count = np.vstack([self.count, np.zeros((grow, 24), dtype=np.int64)])
+            self.slots[appliance_id] = slot
+        return slot
+
+    def _scale(self, mad, mean):
+        return max(MEAN_ABS_DEV_TO_STD * mad, self.min_scale, self.min_scale_fraction * abs(mean))
+
+    def score(self, appliance_id, hour, value):
+        """z-score of a value against its slot, without updating it"""
+        slot = self.slots.get(appliance_id)
+        if slot is None or self.count[slot, hour] < self.warmup:
+            return 0.0
+        scale = self._scale(self.mad[slot, hour], self.mean[slot, hour])
+        return abs(value - self.mean[slot, hour]) / scale
+
+    def update(self, appliance_id, hour, value):
+        """Score a sample and fold it into its slot; returns (z_score, is_anomaly)"""
+        slot = self._slot(appliance_id)
+        n = self.count[slot, hour]
+        mean = self.mean[slot, hour]
+
+        if n == 0:
+            self.mean[slot, hour] = value
+            self.count[slot, hour] = 1
+            return 0.0, False
+
+        mad = self.mad[slot, hour]
+        scale = self._scale(mad, mean)
+        z = abs(value - mean) / scale if n >= self.warmup else 0.0
+        is_anomaly = z > self.threshold
+
+        # Clip outliers before updating so a single spike cannot drag the baseline
+        if is_anomaly:
+            value = mean + np.sign(value - mean) * self.threshold * scale
+        alpha = max(self.alpha, 1.0 / (n + 1))
+        self.mean[slot, hour] = mean + alpha * (value - mean)
+        self.mad[slot, hour] = mad + alpha * (abs(value - mean) - mad)
+        self.count[slot, hour] = n + 1
+        return z, is_anomaly
+
+    def observe_batch(self, batch):
+        """Ingestion observer: score and learn from (timestamp, appliance_id, power_w) samples"""
+        features = []
+        flagged = []
+        for timestamp, appliance_id, power_w in batch:
+            hour = timestamp.hour
+            z, is_anomaly = self.update(appliance_id, hour, power_w)
+            features.append((hour, power_w, z))
+            if is_anomaly:
+                flagged.append((len(features) - 1, timestamp, appliance_id, power_w, z))
+
+        forest = self.forest
+        if forest is not None and flagged:
+            forest_scores = forest.decision_function(np.array([features[i] for i, *_ in flagged]))
+        else:
+            forest_scores = [None] * len(flagged)
+
+        for (_, timestamp, appliance_id, power_w, z), forest_score in zip(flagged, forest_scores):
+            self.events.append({
+                "timestamp": timestamp.isoformat(),
+                "appliance_id": appliance_id,
+                "power_w": power_w,
+                "z_score": round(float(z), 2),
+                "forest_score": None if forest_score is None else round(float(forest_score), 4)
+            })
+
+        self.samples_seen += len(batch)
+        if self.refresh_every:
+            self._reservoir.extend(features)
+            self._since_refresh += len(batch)
+            if self._since_refresh >= self.refresh_every and not self._refreshing.locked():
+                self._since_refresh = 0
+                self._executor.submit(self.refresh_forest, np.array(self._reservoir))
+
+    def refresh_forest(self, features=None):
+        """Refit the IsolationForest on a reservoir snapshot and swap it in"""
+        with self._refreshing:
+            if features is None:
+                features = np.array(self._reservoir)
+            if len(features) < 256:
+                return
+            # Imported here so sklearn only loads once there is enough data to refit on
+            from sklearn.ensemble import IsolationForest
+            self.forest = IsolationForest(contamination='auto', random_state=42).fit(features)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def recent_events(self, limit=20):
+        return list(self.events)[-limit:]
@@ -0,0 +1,92 @@
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, make_response, request
+
+
+class CachedResponse:
+    __slots__ = ('body', 'mimetype', 'etag', 'expires_at')
+
+    def __init__(self, body, mimetype, ttl):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.expires_at = time.monotonic() + ttl
+
+
+class ResponseCache:
+    """TTL + LRU cache of rendered GET responses
+
+    Keys include a state version supplied by the app, so any state change
+    (appliance control, new data, model swap) makes older entries
+    unreachable; they then age out through the TTL and LRU limits.
+    """
+
+    def __init__(self, version_fn, max_entries=256):
+        self.version_fn = version_fn
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0
+        }
+
+    def cached(self, ttl=30):
+        """Decorator caching a view's 200 responses and answering conditional GETs with 304"""
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                key = (request.path, request.query_string, self.version_fn())
+                entry = self.get(key)
+                if entry is None:
+                    self.misses += 1
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    entry = CachedResponse(response.get_data(), response.mimetype, ttl)
+                    self.put(key, entry)
+                else:
+                    self.hits += 1
+
+                if entry.etag in request.if_none_match:
+                    response = Response(status=304)
+                else:
+                    response = Response(entry.body, mimetype=entry.mimetype)
+                response.set_etag(entry.etag)
+                response.headers['Cache-Control'] = 'no-cache'
+                return response
+            return wrapper
+        return decorator
@@ -0,0 +1,94 @@
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RetrainScheduler:
+    """Runs model retraining on a background worker
+
+    The training function is expected to build new models on the side and
+    swap them in with a single assignment, so readers never see a
+    half-trained model. Requests made while a run is in progress are
+    coalesced into one follow-up run.
+    """
+
+    def __init__(self, train_fn, interval=None):
+        self.train_fn = train_fn
+        self.interval = interval
+        self.runs = 0
+        self.last_trained_at = None
+        self.last_duration = None
+        self.last_error = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='retrain')
+        self._lock = threading.Lock()
+        self._future = None
+        self._state = 'idle'
+        self._rerun = False
+        self._stop = threading.Event()
+        self._timer_thread = None
+
+    def request(self):
+        """Schedule a retrain, returning the Future of the run that will cover it (None once stopped)"""
+        with self._lock:
+            if self._stop.is_set():
+                return None
+            if self._state == 'running':
+                self._rerun = True
+                return self._future
+            if self._state == 'queued':
+                return self._future
+            self._state = 'queued'
+            self._future = self._executor.submit(self._run)
+            return self._future
+
+    def _run(self):
+        with self._lock:
+            self._state = 'running'
+            self._rerun = False
+        while True:
+            started = datetime.datetime.now()
+            try:
+                self.train_fn()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+            self.runs += 1
+            self.last_trained_at = datetime.datetime.now()
+            self.last_duration = (self.last_trained_at - started).total_seconds()
+            with self._lock:
+                if not self._rerun:
+                    self._state = 'idle'
+                    return
+                self._rerun = False
+
+    def wait(self, timeout=None):
+        """Block until the current run (if any) has finished"""
+        future = self._future
+        if future is not None:
+            future.result(timeout)
+
+    def start(self):
+        """Start retraining every `interval` seconds in a daemon thread"""
+        if not self.interval or self._timer_thread is not None:
+            return
+        self._timer_thread = threading.Thread(target=self._loop, name='retrain-timer', daemon=True)
+        self._timer_thread.start()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.request()
+
+    def stop(self, wait=True):
+        # Under the lock so a concurrent request() either submits before shutdown or sees the stop
+        with self._lock:
+            self._stop.set()
+        self._executor.shutdown(wait=wait)
+
+    def status(self):
+        return {
+            "state": self._state,
+            "runs": self.runs,
+            "last_trained_at": self.last_trained_at.isoformat() if self.last_trained_at else None,
+            "last_duration_seconds": self.last_duration,
+            "last_error": self.last_error
+        }
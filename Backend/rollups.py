@@ -0,0 +1,86 @@
+import datetime
+
+
+class Aggregate:
+    """Running count/total/min/max for one metric, remembering where the extremes occurred"""
+
+    __slots__ = ('count', 'total', 'min', 'max', 'min_key', 'max_key')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.min_key = None
+        self.max_key = None
+
+    def add(self, value, key=None):
+        self.count += 1
+        self.total += value
+        # Strict comparisons keep the first occurrence, like max()/min() over the list
+        if self.max is None or value > self.max:
+            self.max, self.max_key = value, key
+        if self.min is None or value < self.min:
+            self.min, self.min_key = value, key
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total": round(self.total, 2),
+            "average": round(self.mean, 2),
+            "min": self.min,
+            "max": self.max
+        }
+
+
+class HistoryRollups:
+    """Incrementally maintained totals and per-day/week/month aggregates of the daily history"""
+
+    METRICS = ('consumption', 'cost', 'carbon_footprint')
+    PERIODS = ('day', 'week', 'month')
+
+    def __init__(self):
+        self.totals = {metric: Aggregate() for metric in self.METRICS}
+        self.periods = {period: {} for period in self.PERIODS}
+
+    @classmethod
+    def from_records(cls, records):
+        rollups = cls()
+        for record in records:
+            rollups.add(record)
+        return rollups
+
+    @staticmethod
+    def period_keys(date_str):
+        date = datetime.date.fromisoformat(date_str)
+        iso_year, iso_week, _ = date.isocalendar()
+        return {
+            'day': date_str,
+            'week': f"{iso_year}-W{iso_week:02d}",
+            'month': date_str[:7]
+        }
+
+    def add(self, record):
+        """Fold one daily record into every rollup"""
+        keys = self.period_keys(record['date'])
+        for metric in self.METRICS:
+            value = record[metric]
+            self.totals[metric].add(value, record['date'])
+            for period, key in keys.items():
+                buckets = self.periods[period]
+                if key not in buckets:
+                    buckets[key] = {m: Aggregate() for m in self.METRICS}
+                buckets[key][metric].add(value, record['date'])
+
+    def period_summary(self, period):
+        """Aggregates for every bucket of the period, oldest first"""
+        if period not in self.periods:
+            raise ValueError(f"period must be one of {list(self.PERIODS)}")
+        return [
+            {"period": key, **{metric: agg.to_dict() for metric, agg in buckets.items()}}
+            for key, buckets in sorted(self.periods[period].items())
+        ]
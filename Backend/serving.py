@@ -0,0 +1,299 @@
+"""Production serving: a threaded WSGI server and bounded pools for CPU-bound work
+
+Requests are handled on a fixed pool of threads instead of the single
+threaded development server. Model inference and chart rendering don't run
+on the request thread directly but go through a WorkPool, which caps how
+many calls run and wait at once, answers 503 when that queue is full and
+504 when a call takes longer than its timeout. A burst of slow chart renders
+therefore can't take every request thread and stall cheap routes like
+/api/dashboard. The render pool uses worker processes, so rendering (which
+holds the GIL) scales across cores.
+
+    python future_predictions.py               # serve(create_app(...)) on :5000
+    EMS_DEBUG=1 python future_predictions.py   # Flask's debug server instead
+
+Server-sent event streams (/api/stream) stay open for as long as the client
+is connected, so they are handed to a thread of their own instead of taking
+one of the request threads; EMS_MAX_STREAMS caps how many may be open at
+once (503 beyond that). Any WSGI server that takes an app factory works as well, e.g.
+`gunicorn -w 4 --threads 8 'future_predictions:create_app()'`.
+"""
+import concurrent.futures
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urlsplit
+
+from flask import jsonify
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+from metrics import REGISTRY, CallbackMetric, Histogram
+
+
+class Overloaded(Exception):
+    """A WorkPool's queue is full"""
+
+
+class WorkTimeout(Exception):
+    """A WorkPool call didn't finish within its timeout"""
+
+
+POOL_WAIT = REGISTRY.register(Histogram(
+    'work_pool_wait_seconds', "Time from submitting work to a pool to getting its result", ('pool',)))
+_POOLS = []
+
+
+def _pool_values(field):
+    return [({"pool": pool.name}, pool.stats()[field]) for pool in list(_POOLS)]
+
+
+REGISTRY.register(CallbackMetric('work_pool_in_flight', "Calls running or queued per pool",
+                                 lambda: _pool_values('in_flight')))
+REGISTRY.register(CallbackMetric('work_pool_rejected_total', "Calls refused because the pool's queue was full",
+                                 lambda: _pool_values('rejected'), type='counter'))
+REGISTRY.register(CallbackMetric('work_pool_timeouts_total', "Calls that exceeded the pool's timeout",
+                                 lambda: _pool_values('timeouts'), type='counter'))
+
+
+class WorkPool:
+    """Bounded executor for the CPU-bound parts of request handling
+
+    At most max_workers calls run at once and max_queue more may wait;
+    beyond that run() raises Overloaded immediately rather than queueing
+    without limit. run() waits up to `timeout` seconds for the result and
+    raises WorkTimeout otherwise (a call that already started is not
+    interrupted, it just no longer holds up the request). With
+    processes=True calls run in worker processes, so fn and its arguments
+    must be picklable and the main script needs an `if __name__ ==
+    '__main__'` guard. Workers are started on first use.
+    """
+
+    def __init__(self, name, max_workers=None, max_queue=None, timeout=10.0, processes=False):
+        self.name = name
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = self.max_workers * 4 if max_queue is None else max_queue
+        self.timeout = timeout
+        self.processes = processes
+        self.rejected = 0
+        self.timeouts = 0
+        self._in_flight = 0
+        self._executor = None
+        self._lock = threading.Lock()
+        self._executor_lock = threading.Lock()
+        _POOLS.append(self)
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    if self.processes:
+                        # spawn rather than fork: forking a process that is running server threads isn't safe
+                        self._executor = ProcessPoolExecutor(self.max_workers,
+                                                             mp_context=multiprocessing.get_context('spawn'))
+                    else:
+                        self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix=self.name)
+        return self._executor
+
+    def run(self, fn, *args, **kwargs):
+        """Call fn(*args, **kwargs) on the pool and wait for its result"""
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise Overloaded(self.name)
+            self._in_flight += 1
+        started = time.perf_counter()
+        try:
+            future = self._get_executor().submit(fn, *args, **kwargs)
+        except BaseException:
+            self._release()
+            raise
+        # The slot is held until the call finishes, even if the caller stops waiting for it
+        future.add_done_callback(self._release)
+        try:
+            return future.result(self.timeout)
+        except concurrent.futures.TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            future.cancel()
+            raise WorkTimeout(self.name) from None
+        except BrokenProcessPool:
+            # A worker died (crash, OOM kill); start a fresh pool for the next call
+            self._reset_executor()
+            raise
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - started, pool=self.name)
+
+    def _reset_executor(self):
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self, future=None):
+        with self._lock:
+            self._in_flight -= 1
+
+    def stats(self):
+        return {
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts
+        }
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def handle_pool_errors(app, retry_after=1):
+    """Answer 503 (with Retry-After) for Overloaded and 504 for WorkTimeout"""
+
+    @app.errorhandler(Overloaded)
+    def overloaded(e):
+        response = jsonify({"error": f"Server busy ({e} pool full), retry shortly"})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(retry_after)
+        return response
+
+    @app.errorhandler(WorkTimeout)
+    def work_timeout(e):
+        return jsonify({"error": f"Timed out waiting for the {e} pool"}), 504
+
+
+class PooledRequestHandler(WSGIRequestHandler):
+    # One request per connection: keep-alive would pin a pool thread to an idle client
+    protocol_version = 'HTTP/1.0'
+    # Drop clients that stall mid-request instead of holding a thread
+    timeout = 30
+    detached = False
+
+    def run_wsgi(self):
+        # Streams are answered on their own thread once the request has been parsed
+        if self.server.is_stream(self):
+            self.server.start_stream(self)
+        else:
+            super().run_wsgi()
+
+    def finish(self):
+        # A detached stream's thread finishes the connection when the stream ends
+        if not self.detached:
+            super().finish()
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug WSGI server that handles requests on a fixed pool of threads
+
+    When every thread is busy the accept loop waits, so further connections
+    queue in the listen backlog rather than as unbounded threads. Requests
+    for server-sent events (Accept: text/event-stream, or a path ending in
+    /stream) are long-lived, so after parsing they move to a thread of their
+    own and free their pool thread; at most max_streams are open at once and
+    further ones are answered 503.
+    """
+
+    multithread = True
+
+    def __init__(self, host, port, app, threads=32, backlog=128, max_streams=256):
+        self.threads = threads
+        self.max_streams = max_streams
+        self.streams_rejected = 0
+        self.request_queue_size = backlog
+        self._slots = threading.BoundedSemaphore(threads)
+        self._stream_slots = threading.BoundedSemaphore(max_streams)
+        self._pool = ThreadPoolExecutor(threads, thread_name_prefix='http')
+        super().__init__(host, port, app, handler=PooledRequestHandler)
+
+    def process_request(self, request, client_address):
+        self._slots.acquire()
+        self._pool.submit(self._handle, request, client_address)
+
+    def finish_request(self, request, client_address):
+        return self.RequestHandlerClass(request, client_address, self)
+
+    def _handle(self, request, client_address):
+        handler = None
+        try:
+            handler = self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            if handler is None or not handler.detached:
+                self.shutdown_request(request)
+            self._slots.release()
+
+    @staticmethod
+    def is_stream(handler):
+        return ('text/event-stream' in handler.headers.get('Accept', '')
+                or urlsplit(handler.path).path.endswith('/stream'))
+
+    def start_stream(self, handler):
+        if not self._stream_slots.acquire(blocking=False):
+            self.streams_rejected += 1
+            body = b'{"error": "Too many open streams, retry shortly"}'
+            handler.send_response(503)
+            handler.send_header('Content-Type', 'application/json')
+            handler.send_header('Content-Length', str(len(body)))
+            handler.send_header('Retry-After', '5')
+            handler.end_headers()
+            handler.wfile.write(body)
+            return
+        handler.detached = True
+        try:
+            threading.Thread(target=self._stream, args=(handler,), name='sse', daemon=True).start()
+        except BaseException:
+            handler.detached = False
+            self._stream_slots.release()
+            raise
+
+    def _stream(self, handler):
+        try:
+            WSGIRequestHandler.run_wsgi(handler)
+            handler.wfile.flush()
+        except Exception:
+            self.handle_error(handler.request, handler.client_address)
+        finally:
+            handler.detached = False
+            handler.finish()
+            self.shutdown_request(handler.request)
+            self._stream_slots.release()
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=False)
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def serve(app, host='0.0.0.0', port=5000, threads=None, backlog=128, max_streams=None):
+    """Serve app until interrupted (SIGINT or SIGTERM)
+
+    threads defaults to EMS_SERVER_THREADS or 32, max_streams to
+    EMS_MAX_STREAMS or 256. SIGTERM is handled like Ctrl-C, so the server
+    and pools are closed and atexit handlers (which flush pending writes)
+    still run when a process manager stops the service.
+    """
+    threads = threads or int(os.environ.get('EMS_SERVER_THREADS', 32))
+    max_streams = max_streams or int(os.environ.get('EMS_MAX_STREAMS', 256))
+    server = PooledWSGIServer(host, port, app, threads, backlog, max_streams)
+    print(f" * Serving on http://{host}:{server.port} with {threads} request threads")
+    previous = None
+    if threading.current_thread() is threading.main_thread():
+        previous = signal.signal(signal.SIGTERM, _interrupt)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        for pool in list(_POOLS):
+            pool.close()
+        if previous is not None:
+            signal.signal(signal.SIGTERM, previous)
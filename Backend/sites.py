@@ -0,0 +1,116 @@
+import re
+import threading
+from collections import OrderedDict
+
+SITE_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+class SiteManager:
+    """Per-site EnergyManagementSystem instances, loaded lazily and evicted LRU
+
+    `loader(site_id)` builds a site's state (raising KeyError for unknown
+    sites). At most `max_active` sites stay in memory; the least recently
+    used one is evicted when another has to be loaded, so memory follows the
+    number of active sites rather than the total. Requests hold their site
+    with acquire()/release(); an evicted site that is still held is only
+    closed once the last holder releases it.
+    """
+
+    def __init__(self, loader, max_active=100):
+        self.loader = loader
+        self.max_active = max_active
+        self.loads = 0
+        self.evictions = 0
+        self._sites = OrderedDict()
+        self._loading = {}
+        self._holders = {}
+        self._retired = set()
+        self._lock = threading.Lock()
+
+    def get(self, site_id):
+        return self._get(site_id, hold=False)
+
+    def acquire(self, site_id):
+        """Like get(), but the site stays open (even if evicted) until release(site)"""
+        return self._get(site_id, hold=True)
+
+    def release(self, site):
+        with self._lock:
+            remaining = self._holders[site] - 1
+            if remaining:
+                self._holders[site] = remaining
+                return
+            del self._holders[site]
+            if site not in self._retired:
+                return
+            self._retired.discard(site)
+        site.close()
+
+    def _get(self, site_id, hold):
+        if not SITE_ID_PATTERN.match(site_id):
+            raise KeyError(site_id)
+
+        with self._lock:
+            site = self._sites.get(site_id)
+            if site is not None:
+                self._sites.move_to_end(site_id)
+                if hold:
+                    self._holders[site] = self._holders.get(site, 0) + 1
+                return site
+            load_lock = self._loading.setdefault(site_id, threading.Lock())
+
+        # Load outside the manager lock so one slow site doesn't stall the others
+        with load_lock:
+            with self._lock:
+                site = self._sites.get(site_id)
+                if site is not None:
+                    if hold:
+                        self._holders[site] = self._holders.get(site, 0) + 1
+                    return site
+            try:
+                site = self.loader(site_id)
+                self._insert(site_id, site, hold)
+            finally:
+                with self._lock:
+                    self._loading.pop(site_id, None)
+            return site
+
+    def _insert(self, site_id, site, hold=False):
+        evicted = []
+        with self._lock:
+            self._sites[site_id] = site
+            self._sites.move_to_end(site_id)
+            if hold:
+                self._holders[site] = self._holders.get(site, 0) + 1
+            self.loads += 1
+            while len(self._sites) > self.max_active:
+                cold_site = self._sites.popitem(last=False)[1]
+                self.evictions += 1
+                # Sites still serving a request are closed by the last release() instead
+                if cold_site in self._holders:
+                    self._retired.add(cold_site)
+                else:
+                    evicted.append(cold_site)
+        for cold_site in evicted:
+            cold_site.close()
+
+    def active_sites(self):
+        with self._lock:
+            return list(self._sites)
+
+    def close_all(self):
+        with self._lock:
+            sites = list(self._sites.values()) + list(self._retired)
+            self._sites.clear()
+            self._retired.clear()
+        for site in sites:
+            site.close()
+
+    def stats(self):
+        return {
+            "active_sites": len(self._sites),
+            "max_active": self.max_active,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "retiring": len(self._retired)
+        }
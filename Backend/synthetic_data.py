@@ -0,0 +1,213 @@
+"""Synthetic energy data at scale, streamed to disk
+
+Simulates every appliance of every site hour by hour (or minute by
+minute) and writes, per site:
+
+    sites/<site_id>/energy_data.json   appliances + daily history (the service's format)
+    sites/<site_id>/readings.ndjson    per-appliance power samples for /api/ingest
+    sites/<site_id>/hourly.ndjson      site totals + temperature for /energy_analysis/readings
+
+Each day is generated and written before the next, so memory stays flat
+however many years are requested.
+
+    python synthetic_data.py --sites 50 --appliances 20 --years 3 --resolution minute
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from history_store import HistoryStore, history_path_for
+from timeseries import DailySeries
+
+COST_PER_KWH = 0.12
+CARBON_PER_KWH = 0.4
+PEAK_HOURS = slice(14, 20)
+STEPS_PER_HOUR = {'hour': 1, 'minute': 60}
+
+
+def _profile(*hours, base=0.05, level=0.8):
+    """24-hour on-probability curve: `level` during the given hours, `base` otherwise"""
+    curve = np.full(24, base)
+    curve[list(hours)] = level
+    return curve
+
+
+# (name, type, power_rating W, hourly on-probability, weekend multiplier)
+CATALOGUE = [
+    ("Smart AC", "HVAC", 3500, _profile(*range(11, 22), base=0.15, level=0.9), 1.2),
+    ("LED Lights", "Lighting", 150, _profile(6, 7, *range(17, 24), level=0.9), 1.1),
+    ("Refrigerator", "Kitchen", 400, _profile(base=0.45), 1.0),
+    ("Smart TV", "Entertainment", 250, _profile(*range(18, 23), level=0.7), 1.5),
+    ("Washing Machine", "Appliance", 2000, _profile(9, 10, 19, base=0.0, level=0.15), 2.0),
+    ("Water Heater", "Utility", 4500, _profile(6, 7, 8, 19, 20, base=0.02, level=0.5), 1.1),
+    ("Dishwasher", "Kitchen", 1800, _profile(20, 21, base=0.0, level=0.3), 1.3),
+    ("Smart Thermostat", "HVAC", 50, _profile(base=1.0), 1.0),
+    ("Desktop Computer", "Electronics", 500, _profile(*range(9, 18), level=0.6), 0.6),
+    ("LED Lights Bedroom", "Lighting", 100, _profile(6, 21, 22, 23, level=0.8), 1.1),
+]
+
+
+def make_appliances(count, rng):
+    """`count` appliances cycling through the catalogue, with the usage model for each"""
+    appliances, profiles, weekend = [], [], []
+    for i in range(count):
+        name, appliance_type, power_rating, profile, weekend_factor = CATALOGUE[i % len(CATALOGUE)]
+        if i >= len(CATALOGUE):
+            name = f"{name} {i // len(CATALOGUE) + 1}"
+        appliances.append({
+            "id": i + 1,
+            "name": name,
+            "type": appliance_type,
+            "power_rating": power_rating,
+            "status": "on" if rng.random() < profile.mean() + 0.3 else "off"
+        })
+        profiles.append(profile)
+        weekend.append(weekend_factor)
+    return appliances, np.array(profiles), np.array(weekend)
+
+
+def simulate_day(day, appliances, profiles, weekend, steps_per_hour, rng):
+    """Power (W) per appliance and step, plus the hourly temperature, for one day"""
+    day_of_year = (day - day.astype('datetime64[Y]')).astype(int)
+    hours = np.arange(24)
+    temperature = (15 + 10 * np.sin(2 * np.pi * (day_of_year - 110) / 365)
+                   + 5 * np.sin(2 * np.pi * (hours - 9) / 24)
+                   + rng.normal(0, 1.5, 24))
+
+    probability = profiles.copy()
+    if day.astype(object).weekday() >= 5:
+        probability *= weekend[:, None]
+    # Heating and cooling demand grows with the distance from a comfortable 21°C
+    is_hvac = np.array([a['type'] == 'HVAC' and a['power_rating'] > 100 for a in appliances])
+    probability[is_hvac] *= np.clip(np.abs(temperature - 21) / 8, 0.1, 1.0)
+    on = rng.random(probability.shape) < np.clip(probability, 0, 1)
+
+    ratings = np.array([a['power_rating'] for a in appliances], dtype=float)
+    power = np.repeat(on, steps_per_hour, axis=1) * ratings[:, None]
+    power *= rng.uniform(0.85, 1.05, power.shape)
+
+    # Occasional faults: one appliance draws far more than rated for an hour
+    if rng.random() < 0.02:
+        a, h = rng.integers(len(appliances)), rng.integers(24)
+        power[a, h * steps_per_hour:(h + 1) * steps_per_hour] = ratings[a] * 2.5
+    return power, temperature
+
+
+def daily_record(day, power, steps_per_hour):
+    step_kwh = power.sum(axis=0) / 1000 / steps_per_hour
+    consumption = float(step_kwh.sum())
+    peak = float(step_kwh[PEAK_HOURS.start * steps_per_hour:PEAK_HOURS.stop * steps_per_hour].sum())
+    peak_share = peak / consumption if consumption else 0
+    return {
+        "date": str(day),
+        "consumption": round(consumption, 2),
+        "cost": round(consumption * COST_PER_KWH, 2),
+        "carbon_footprint": round(consumption * CARBON_PER_KWH, 2),
+        "peak_hours_usage": round(peak, 2),
+        "efficiency_score": int(np.clip(95 - 100 * (peak_share - 0.2), 65, 95))
+    }
+
+
+def reading_lines(day, power, steps_per_hour):
+    """NDJSON power samples, one per appliance and step"""
+    step = np.timedelta64(3600 // steps_per_hour, 's')
+    stamps = np.datetime_as_string(day.astype('datetime64[s]') + np.arange(power.shape[1]) * step)
+    watts = np.round(power, 1).tolist()
+    return [
+        f'{{"timestamp":"{stamp}","appliance_id":{a + 1},"power_w":{watts[a][s]}}}\n'
+        for s, stamp in enumerate(stamps)
+        for a in range(len(watts))
+    ]
+
+
+def hourly_lines(day, power, temperature, steps_per_hour):
+    """NDJSON site totals per hour, in the shape /energy_analysis/readings expects"""
+    hourly_kwh = power.sum(axis=0).reshape(24, steps_per_hour).sum(axis=1) / 1000 / steps_per_hour
+    stamps = np.datetime_as_string(day.astype('datetime64[h]') + np.arange(24))
+    return [
+        f'{{"timestamp":"{stamp}:00:00","energy_kwh":{kwh:.4f},"temperature_c":{temp:.1f}}}\n'
+        for stamp, kwh, temp in zip(stamps, hourly_kwh, temperature)
+    ]
+
+
+def generate_site(site_dir, appliances=10, days=365, start='2024-01-01', resolution='hour',
+                  seed=0, readings=True, columnar=False):
+    """Simulate one site and stream its files into site_dir"""
+    rng = np.random.default_rng(seed)
+    steps_per_hour = STEPS_PER_HOUR[resolution]
+    os.makedirs(site_dir, exist_ok=True)
+    appliance_list, profiles, weekend = make_appliances(appliances, rng)
+
+    history = DailySeries(capacity=days)
+    samples = 0
+    data_path = os.path.join(site_dir, 'energy_data.json')
+    readings_file = open(os.path.join(site_dir, 'readings.ndjson'), 'w') if readings else None
+    try:
+        with open(data_path, 'w') as data_file, open(os.path.join(site_dir, 'hourly.ndjson'), 'w') as hourly_file:
+            data_file.write('{"appliances":')
+            json.dump(appliance_list, data_file, separators=(',', ':'))
+            data_file.write(',"historical_data":[')
+
+            first_day = np.datetime64(start, 'D')
+            for i in range(days):
+                day = first_day + i
+                power, temperature = simulate_day(day, appliance_list, profiles, weekend, steps_per_hour, rng)
+                record = daily_record(day, power, steps_per_hour)
+                history.append(record)
+                data_file.write((',' if i else '') + json.dumps(record, separators=(',', ':')))
+                hourly_file.writelines(hourly_lines(day, power, temperature, steps_per_hour))
+                if readings_file:
+                    readings_file.writelines(reading_lines(day, power, steps_per_hour))
+                    samples += power.size
+
+            data_file.write(']}')
+    finally:
+        if readings_file:
+            readings_file.close()
+
+    if columnar:
+        HistoryStore.write(history_path_for(data_path), appliance_list, history)
+    return {"site_dir": site_dir, "days": days, "appliances": appliances, "samples": samples}
+
+
+def generate(out='sites', sites=1, appliances=10, years=1.0, start='2024-01-01', resolution='hour',
+             seed=0, readings=True, columnar=False):
+    """Generate `sites` sites named site-0001, site-0002, ... under out"""
+    days = max(1, int(round(years * 365)))
+    started = time.perf_counter()
+    reports = [
+        generate_site(os.path.join(out, f'site-{n:04d}'), appliances, days, start, resolution,
+                      seed + n, readings, columnar)
+        for n in range(1, sites + 1)
+    ]
+    return {
+        "sites": sites,
+        "days_per_site": days,
+        "samples": sum(r['samples'] for r in reports),
+        "seconds": round(time.perf_counter() - started, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic sites for scale and load testing")
+    parser.add_argument('--out', default='sites')
+    parser.add_argument('--sites', type=int, default=1)
+    parser.add_argument('--appliances', type=int, default=10)
+    parser.add_argument('--years', type=float, default=1.0)
+    parser.add_argument('--start', default='2024-01-01')
+    parser.add_argument('--resolution', choices=sorted(STEPS_PER_HOUR), default='hour')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-readings', action='store_true', help="skip per-appliance readings.ndjson")
+    parser.add_argument('--columnar', action='store_true', help="also write the memory-mapped history store")
+    args = parser.parse_args()
+
+    summary = generate(args.out, args.sites, args.appliances, args.years, args.start, args.resolution,
+                       args.seed, not args.no_readings, args.columnar)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    main()
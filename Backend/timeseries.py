@@ -0,0 +1,121 @@
+import numpy as np
+
+
+class DailySeries:
+    """Columnar store for the daily history (one typed NumPy array per field)
+
+    Arrays grow by doubling, so append is amortized O(1). Slicing returns a
+    DailySeries sharing the same buffers, and column()/to_frame() hand out
+    views, so pandas and sklearn read the data without copying it.
+    """
+
+    COLUMNS = {
+        'consumption': np.float64,
+        'cost': np.float64,
+        'carbon_footprint': np.float64,
+        'peak_hours_usage': np.float64,
+        'efficiency_score': np.float64
+    }
+
+    def __init__(self, capacity=64):
+        self._dates = np.empty(capacity, dtype='datetime64[D]')
+        self._columns = {name: np.full(capacity, np.nan, dtype=dtype) for name, dtype in self.COLUMNS.items()}
+        self._size = 0
+
+    @classmethod
+    def from_records(cls, records):
+        series = cls(capacity=max(64, len(records)))
+        series.extend(records)
+        return series
+
+    @classmethod
+    def from_arrays(cls, dates, columns):
+        """Wrap existing arrays (e.g. memory-mapped ones) without copying them"""
+        series = cls.__new__(cls)
+        series._dates = dates
+        series._columns = columns
+        series._size = len(dates)
+        return series
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            raise TypeError("DailySeries only supports slicing; use to_records() for rows")
+        start, stop, step = key.indices(self._size)
+        return DailySeries.from_arrays(
+            self._dates[start:stop:step],
+            {name: values[start:stop:step] for name, values in self._columns.items()}
+        )
+
+    def _reserve(self, size):
+        capacity = len(self._dates)
+        if size <= capacity:
+            return
+        capacity = max(size, capacity * 2, 64)
+
+        dates = np.empty(capacity, dtype='datetime64[D]')
+        dates[:self._size] = self._dates[:self._size]
+        columns = {}
+        for name, values in self._columns.items():
+            grown = np.full(capacity, np.nan, dtype=values.dtype)
+            grown[:self._size] = values[:self._size]
+            columns[name] = grown
+        # Swap in the grown buffers; views handed out earlier keep the old ones
+        self._dates, self._columns = dates, columns
+
+    def append(self, record):
+        self._reserve(self._size + 1)
+        i = self._size
+        self._dates[i] = np.datetime64(record['date'], 'D')
+        for name, values in self._columns.items():
+            values[i] = record.get(name, np.nan)
+        self._size += 1
+
+    def extend(self, records):
+        records = list(records)
+        self._reserve(self._size + len(records))
+        start, stop = self._size, self._size + len(records)
+        self._dates[start:stop] = np.array([r['date'] for r in records], dtype='datetime64[D]')
+        for name, values in self._columns.items():
+            values[start:stop] = [r.get(name, np.nan) for r in records]
+        self._size = stop
+
+    def between(self, start=None, end=None):
+        """Days from start to end inclusive, as a view; dates are kept in ascending order"""
+        dates = self.dates
+        lo = 0 if start is None else int(np.searchsorted(dates, np.datetime64(start, 'D'), side='left'))
+        hi = self._size if end is None else int(np.searchsorted(dates, np.datetime64(end, 'D'), side='right'))
+        return self[lo:max(lo, hi)]
+
+    @property
+    def dates(self):
+        return self._dates[:self._size]
+
+    def column(self, name):
+        """Read-only view of one column"""
+        view = self._columns[name][:self._size]
+        view.flags.writeable = False
+        return view
+
+    def to_frame(self):
+        """DataFrame over the column buffers (date as datetime64)"""
+        import pandas as pd  # deferred: only training and analysis need frames
+        data = {'date': self.dates}
+        data.update({name: values[:self._size] for name, values in self._columns.items()})
+        return pd.DataFrame(data, copy=False)
+
+    def to_records(self):
+        """Rows as the dicts energy_data.json uses; fields that were never set are omitted"""
+        dates = self.dates.astype(str).tolist()
+        columns = {name: values[:self._size].tolist() for name, values in self._columns.items()}
+        records = []
+        for i, date in enumerate(dates):
+            record = {'date': date}
+            for name, values in columns.items():
+                value = values[i]
+                if value == value:  # skip NaN
+                    record[name] = int(value) if name == 'efficiency_score' else value
+            records.append(record)
+        return records
@@ -0,0 +1,149 @@
+"""Parallel model training for every site
+
+Fans one job per site out across a process pool, writes the fitted models
+to each site's model registry and reports per-job timing. Running sites
+pick the artifacts up on their next (re)train without refitting.
+
+    python training_pipeline.py --workers 8 --report training_report.json
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from history_store import HistoryStore, history_path_for, load_site_data
+from model_registry import ModelRegistry
+
+
+# sklearn estimators are imported inside the factories so importing this module stays cheap
+def make_prediction_model(n_jobs=None):
+    from sklearn.ensemble import RandomForestRegressor
+    return RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=n_jobs)
+
+
+def make_anomaly_detector(n_jobs=None):
+    from sklearn.ensemble import IsolationForest
+    return IsolationForest(contamination=0.1, random_state=42, n_jobs=n_jobs)
+
+
+def fit_site_models(model_registry, historical_data, n_jobs=None):
+    """Fit (or load) the prediction and anomaly models for one site's DailySeries"""
+    if len(historical_data) < 7:
+        return None
+
+    df = historical_data.to_frame()
+    df['day_of_week'] = df['date'].dt.dayofweek
+    df['day_of_month'] = df['date'].dt.day
+
+    features = ['day_of_week', 'day_of_month']
+    X = df[features].values
+    y = df['consumption'].values
+
+    # Models are only refit when the training data changes; otherwise they load from disk
+    prediction_model = model_registry.load_or_fit('ems_prediction', make_prediction_model(n_jobs), X, y)
+
+    consumption_reshaped = df['consumption'].values.reshape(-1, 1)
+    anomaly_detector = model_registry.load_or_fit('ems_anomaly', make_anomaly_detector(n_jobs), consumption_reshaped)
+
+    # n_jobs only speeds up fitting; single-row predictions are faster without thread fan-out
+    prediction_model.set_params(n_jobs=None)
+    anomaly_detector.set_params(n_jobs=None)
+    return prediction_model, anomaly_detector
+
+
+def train_site(job, n_jobs=1):
+    """Train one site in a worker process; returns a timing report for the job"""
+    started = time.perf_counter()
+    report = {"site_id": job['site_id'], "status": "ok", "error": None}
+    try:
+        _, history = load_site_data(job['data_path'], history_path_for(job['data_path']))
+        loaded = time.perf_counter()
+
+        registry = ModelRegistry(job['model_dir'])
+        models = fit_site_models(registry, history, n_jobs=n_jobs)
+        if models is None:
+            report["status"] = "skipped"
+        report.update({
+            "rows": len(history),
+            "load_seconds": round(loaded - started, 4),
+            "fit_seconds": round(time.perf_counter() - loaded, 4),
+            "versions": dict(registry.versions)
+        })
+    except Exception as e:
+        report.update({"status": "failed", "error": str(e)})
+    report["total_seconds"] = round(time.perf_counter() - started, 4)
+    return report
+
+
+def discover_jobs(sites_root='sites', include_default=True):
+    """One job per site directory with an energy_data.json or history store, plus the default site"""
+    def has_data(data_path):
+        return os.path.exists(data_path) or HistoryStore.exists(history_path_for(data_path))
+
+    jobs = []
+    if include_default and has_data('energy_data.json'):
+        jobs.append({"site_id": 'default', "data_path": 'energy_data.json', "model_dir": 'models'})
+    if os.path.isdir(sites_root):
+        for site_id in sorted(os.listdir(sites_root)):
+            site_dir = os.path.join(sites_root, site_id)
+            data_path = os.path.join(site_dir, 'energy_data.json')
+            if has_data(data_path):
+                jobs.append({"site_id": site_id, "data_path": data_path, "model_dir": os.path.join(site_dir, 'models')})
+    return jobs
+
+
+def run_training(jobs, max_workers=None, n_jobs=None):
+    """Train all jobs across a process pool
+
+    When n_jobs is not given, cores left over after one worker per job are
+    handed to the estimators themselves.
+    """
+    cpus = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers or cpus, len(jobs) or 1))
+    if n_jobs is None:
+        n_jobs = max(1, cpus // max_workers)
+
+    started = time.perf_counter()
+    reports = []
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(train_site, job, n_jobs) for job in jobs]
+        for future in as_completed(futures):
+            reports.append(future.result())
+    wall = time.perf_counter() - started
+
+    reports.sort(key=lambda r: r['site_id'])
+    busy = sum(r['total_seconds'] for r in reports)
+    return {
+        "jobs": reports,
+        "summary": {
+            "sites": len(reports),
+            "failed": sum(1 for r in reports if r['status'] == 'failed'),
+            "workers": max_workers,
+            "estimator_n_jobs": n_jobs,
+            "wall_seconds": round(wall, 3),
+            "busy_seconds": round(busy, 3),
+            "parallel_speedup": round(busy / wall, 2) if wall else None
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train models for every site in parallel")
+    parser.add_argument('--sites-root', default='sites')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--n-jobs', type=int, default=None, help="threads per estimator fit")
+    parser.add_argument('--no-default', action='store_true', help="skip the default site")
+    parser.add_argument('--report', default=None, help="write the JSON report here")
+    args = parser.parse_args()
+
+    jobs = discover_jobs(args.sites_root, include_default=not args.no_default)
+    result = run_training(jobs, max_workers=args.workers, n_jobs=args.n_jobs)
+    print(json.dumps(result['summary'], indent=2))
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,8 @@ class EnergyApp {
       data: null,
       charts: {},
       updateInterval: null,
+      apiBaseUrl: "http://localhost:5000",
+      eventSource: null,
       sponsoredProducts: [
         {
           id: 1,
@@ -823,6 +825,31 @@ class EnergyApp {
   }
 
   startRealTimeUpdates() {
+    // Already connected (or connecting): don't open a second stream
+    const source = this.state.eventSource;
+    if (source && source.readyState !== EventSource.CLOSED) {
+      return;
+    }
+    // Prefer server-pushed deltas; fall back to the local polling loop
+    if (window.EventSource && this.connectEventStream()) {
+      return;
+    }
+    this.startPolling();
+  }
+
+  stopRealTimeUpdates() {
+    if (this.state.eventSource) {
+      this.state.eventSource.close();
+      this.state.eventSource = null;
+    }
+    if (this.state.updateInterval) {
+      clearInterval(this.state.updateInterval);
+      this.state.updateInterval = null;
+    }
+  }
+
+  startPolling() {
+    if (this.state.updateInterval) return;
     this.state.updateInterval = setInterval(() => {
       this.updateLastUpdateTime();
       // Simulate minor data fluctuations
@@ -830,6 +857,66 @@ class EnergyApp {
     }, 30000); // Update every 30 seconds
   }
 
+  connectEventStream() {
+    try {
+      const source = new EventSource(`${this.state.apiBaseUrl}/api/stream`);
+      this.state.eventSource = source;
+
+      source.addEventListener("snapshot", (e) =>
+        this.applyStreamUpdate(JSON.parse(e.data))
+      );
+      source.addEventListener("consumption", (e) =>
+        this.applyStreamUpdate(JSON.parse(e.data))
+      );
+      source.addEventListener("appliance", (e) => {
+        const update = JSON.parse(e.data);
+        this.applyStreamUpdate({ appliances: { [update.id]: update.status } });
+      });
+      source.addEventListener("alert", (e) => {
+        const alert = JSON.parse(e.data);
+        this.showToast(alert.title, alert.message, alert.type === "warning" ? "warning" : "info");
+      });
+
+      // The browser retries on its own; poll locally while the stream is down
+      source.onerror = () => this.startPolling();
+      source.onopen = () => {
+        if (this.state.updateInterval) {
+          clearInterval(this.state.updateInterval);
+          this.state.updateInterval = null;
+        }
+      };
+      return true;
+    } catch (error) {
+      return false;
+    }
+  }
+
+  applyStreamUpdate(update) {
+    const realTime = this.state.data.real_time;
+    if (update.current_consumption !== undefined) {
+      realTime.total_power = update.current_consumption * 1000;
+      realTime.active_appliances = update.active_appliances;
+      realTime.estimated_daily_cost = update.estimated_daily_cost;
+    }
+
+    if (update.appliances) {
+      let changed = false;
+      this.state.data.appliances.forEach((appliance) => {
+        const status = update.appliances[appliance.id];
+        if (status && status !== appliance.status) {
+          appliance.status = status;
+          changed = true;
+        }
+      });
+      if (changed) this.renderAppliances();
+    }
+
+    this.updateLastUpdateTime();
+    if (this.state.currentSection === "dashboard") {
+      this.renderDashboard();
+    }
+  }
+
   updateLastUpdateTime() {
     const now = new Date();
     const timeString = now.toLocaleTimeString();
@@ -1000,9 +1087,7 @@ if (typeof window !== "undefined") {
   document.addEventListener("visibilitychange", () => {
     if (window.energyApp) {
       if (document.hidden) {
-        if (window.energyApp.state.updateInterval) {
-          clearInterval(window.energyApp.state.updateInterval);
-        }
+        window.energyApp.stopRealTimeUpdates();
       } else {
         window.energyApp.startRealTimeUpdates();
       }
@@ -131,8 +131,8 @@ complete_data = {
     "gamification": gamification
 }
 
-# Convert to JSON and save
-json_data = json.dumps(complete_data, indent=2)
+# Convert to JSON and save (compact separators; pretty-printing roughly doubles the file)
+json_data = json.dumps(complete_data, separators=(',', ':'))
 print("Sample data structure created successfully!")
 print(f"Total appliances: {len(appliances)}")
 print(f"Historical data points: {len(historical_data)}")